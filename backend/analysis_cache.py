@@ -0,0 +1,152 @@
+"""Content-hash cache of LLM analyses, with optional MinHash near-duplicate lookup.
+
+Cross-posts, reposts and boilerplate "alternative to X" posts normalize to
+the same (or nearly the same) text, so their analysis can be reused instead
+of paying for another LLM call.
+"""
+import hashlib
+import json
+import re
+from array import array
+from config import ANALYSIS_CACHE_MAX_ENTRIES, ANALYSIS_CACHE_NEAR_DUPLICATES
+from database import (
+    get_cached_analyses, find_cache_candidates, touch_cache_entries, store_cached_analyses,
+)
+
+NUM_PERMUTATIONS = 64
+BANDS = 8  # 8 bands x 8 rows: candidates start showing up around 0.77 similarity
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+NEAR_DUPLICATE_THRESHOLD = 0.8
+NEAR_DUPLICATE_MIN_WORDS = 10  # Shorter texts only hit exact matches
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME)
+    for i in range(NUM_PERMUTATIONS)
+]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop URLs and punctuation, collapse whitespace."""
+    text = re.sub(r"https?://\S+", " ", text.lower())
+    return " ".join(re.findall(r"[a-z0-9']+", text))
+
+
+def content_hash(post: dict) -> str:
+    normalized = "\x00".join([
+        post.get("post_type") or "submission",
+        normalize_text(post.get("title") or ""),
+        normalize_text(post.get("body") or ""),
+    ])
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def minhash_signature(text: str) -> list[int]:
+    words = normalize_text(text).split()
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    hashed = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_buckets(signature: list[int]) -> list[tuple[int, str]]:
+    return [
+        (band, hashlib.blake2b(
+            array("Q", signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]).tobytes(),
+            digest_size=8,
+        ).hexdigest())
+        for band in range(BANDS)
+    ]
+
+
+def estimated_similarity(sig_a: list[int], sig_b: list[int]) -> float:
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / NUM_PERMUTATIONS
+
+
+class AnalysisCache:
+    """Looks up and stores analyses by normalized post content.
+
+    Exact matches are keyed on content_hash(); with near_duplicates enabled,
+    misses fall back to MinHash LSH over title+body shingles (the body alone
+    for comments, which carry their submission's title). Entries beyond
+    max_entries are evicted least-recently-used first.
+    """
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES,
+                 near_duplicates: bool = ANALYSIS_CACHE_NEAR_DUPLICATES):
+        self.max_entries = max_entries
+        self.near_duplicates = near_duplicates
+        self.hits = 0
+        self.misses = 0
+
+    def _signature(self, post: dict) -> list[int] | None:
+        """MinHash of the post's own text, or None if it is too short for the
+        similarity estimate to say anything."""
+        if post.get("post_type") == "comment":
+            text = post.get("body") or ""
+        else:
+            text = f"{post.get('title') or ''} {post.get('body') or ''}"
+        if len(normalize_text(text).split()) < NEAR_DUPLICATE_MIN_WORDS:
+            return None
+        return minhash_signature(text)
+
+    def lookup_many(self, posts: list[dict]) -> dict:
+        """Return {post_id: cached analysis} for the posts that hit the cache."""
+        hashes = {post["id"]: content_hash(post) for post in posts}
+        exact = get_cached_analyses(list(set(hashes.values())))
+        found, used = {}, []
+
+        for post in posts:
+            h = hashes[post["id"]]
+            if h in exact:
+                found[post["id"]] = exact[h]
+                used.append(h)
+            elif self.near_duplicates:
+                match = self._near_duplicate(post)
+                if match:
+                    found[post["id"]] = match[1]
+                    used.append(match[0])
+
+        if used:
+            touch_cache_entries(used)
+        self.hits += len(found)
+        self.misses += len(posts) - len(found)
+        return found
+
+    def _near_duplicate(self, post: dict):
+        signature = self._signature(post)
+        if signature is None:
+            return None
+        best = None
+        for candidate in find_cache_candidates(band_buckets(signature)):
+            if not candidate["minhash"]:
+                continue
+            similarity = estimated_similarity(signature, array("Q", candidate["minhash"]).tolist())
+            if similarity >= NEAR_DUPLICATE_THRESHOLD and (best is None or similarity > best[0]):
+                best = (similarity, candidate)
+        if best:
+            return best[1]["content_hash"], json.loads(best[1]["analysis"])
+        return None
+
+    def store_many(self, items: list[tuple[dict, dict]]):
+        """Cache (post, analysis) pairs from fresh LLM results."""
+        entries = []
+        for post, analysis in items:
+            entry = {"content_hash": content_hash(post), "analysis": analysis,
+                     "minhash": None, "buckets": []}
+            signature = self._signature(post) if self.near_duplicates else None
+            if signature is not None:
+                entry["minhash"] = array("Q", signature).tobytes()
+                entry["buckets"] = band_buckets(signature)
+            entries.append(entry)
+        if entries:
+            store_cached_analyses(entries, self.max_entries)
+
+    def stats(self) -> dict:
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
+
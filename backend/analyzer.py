@@ -1,12 +1,32 @@
 """LLM-powered pain point analyzer. Supports Gemini and Claude."""
 import json
 import logging
+import os
+import random
+import re
+import socket
 import time
-from config import GOOGLE_API_KEY, ANTHROPIC_API_KEY, LLM_PROVIDER, CATEGORIES
-from database import get_unanalyzed_posts, insert_analysis
+import zlib
+from typing import Iterable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import (
+    GOOGLE_API_KEY, ANTHROPIC_API_KEY, LLM_PROVIDER, CATEGORIES,
+    ANALYSIS_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, FAKE_LLM_LATENCY,
+    ANALYSIS_STRATEGY, BATCH_TOKEN_BUDGET, BATCH_MAX_POSTS, RELEVANCE_FILTER, ANALYSIS_LEASE_SECONDS,
+    CLUSTER_NEW_ANALYSES,
+)
+from database import claim_posts, insert_analyses_bulk
+from ratelimit import TokenBucket
+from analysis_cache import AnalysisCache
 
 logger = logging.getLogger(__name__)
 
+# Default request budgets per provider, in requests per minute
+PROVIDER_RATE_LIMITS = {"claude": 50, "gemini": 15, "fake": 6000}
+MAX_RETRIES = 4
+WRITE_BATCH_SIZE = 10  # Analyses buffered before each database write
+BATCH_OUTPUT_TOKENS_PER_POST = 600  # max_tokens reserved per post in a batched request
+
 ANALYSIS_PROMPT = """Analyze this Reddit post for pain points and product opportunities.
 
 **Subreddit:** r/{subreddit}
@@ -36,9 +56,46 @@ If the post doesn't contain a clear pain point, set opportunity_score to 10 or b
 """
 
 
+BATCH_ANALYSIS_PROMPT = """Analyze each of the Reddit posts below for pain points and product opportunities.
+
+{posts}
+---
+
+Return a JSON array (no markdown, just raw JSON) with exactly one object per post above:
+[
+    {{
+        "post_id": "The id from the post's heading, copied exactly",
+        "pain_point_summary": "One clear sentence describing the user's pain point or frustration",
+        "category": "One of: {categories}",
+        "severity": <1-5 integer, where 5 is extreme frustration>,
+        "affected_audience": "Who experiences this problem (be specific)",
+        "potential_solutions": ["Idea 1: brief description", "Idea 2: brief description", "Idea 3: brief description"],
+        "market_size_estimate": "Small|Medium|Large - brief reasoning",
+        "existing_solutions": ["Tool 1", "Tool 2"],
+        "opportunity_score": <1-100 integer based on: severity * market size * lack of existing solutions * engagement>
+    }}
+]
+
+Be practical and specific. Focus on actionable software/product ideas.
+If a post doesn't contain a clear pain point, set its opportunity_score to 10 or below and note that in the summary.
+"""
+
+BATCH_POST_TEMPLATE = """### Post {post_id}
+**Subreddit:** r/{subreddit}
+**Title:** {title}
+**Post type:** {post_type}
+**Upvotes:** {score}
+**Comments:** {num_comments}
+**Content:**
+{body}
+"""
+
+
 def get_provider():
     """Determine which LLM provider to use."""
-    if LLM_PROVIDER == "claude" and ANTHROPIC_API_KEY:
+    if LLM_PROVIDER == "fake":
+        return "fake"
+    elif LLM_PROVIDER == "claude" and ANTHROPIC_API_KEY:
         return "claude"
     elif LLM_PROVIDER == "gemini" and GOOGLE_API_KEY:
         return "gemini"
@@ -50,9 +107,63 @@ def get_provider():
     raise ValueError("No LLM API key configured. Set ANTHROPIC_API_KEY or GOOGLE_API_KEY in .env")
 
 
-def analyze_post_claude(client, post: dict) -> dict:
-    """Analyze a single post with Claude."""
-    prompt = ANALYSIS_PROMPT.format(
+def _is_rate_limited(exc: Exception) -> bool:
+    """True for provider 429 errors (anthropic uses status_code, google-genai uses code)."""
+    return getattr(exc, "status_code", None) == 429 or getattr(exc, "code", None) == 429
+
+
+def _retry_after(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _strip_fences(raw_text: str) -> str:
+    raw_text = raw_text.strip()
+    if raw_text.startswith("```"):
+        raw_text = raw_text.split("\n", 1)[1] if "\n" in raw_text else raw_text[3:]
+    if raw_text.endswith("```"):
+        raw_text = raw_text[:-3]
+    return raw_text.strip()
+
+
+def _complete_claude(client, prompt: str, max_tokens: int = 1024) -> str:
+    message = client.messages.create(
+        model="claude-sonnet-4-20250514",
+        max_tokens=max_tokens,
+        messages=[{"role": "user", "content": prompt}],
+    )
+    return message.content[0].text
+
+
+def _complete_gemini(client, prompt: str, max_tokens: int = 1024) -> str:
+    from google.genai import types
+    response = client.models.generate_content(
+        model="gemini-2.0-flash",
+        contents=prompt,
+        config=types.GenerateContentConfig(max_output_tokens=max_tokens),
+    )
+    return response.text
+
+
+def _parse_failed() -> dict:
+    return {
+        "pain_point_summary": "Analysis failed - could not parse LLM response",
+        "category": "Other", "severity": 1, "affected_audience": "Unknown",
+        "potential_solutions": [], "market_size_estimate": "Unknown",
+        "existing_solutions": [], "opportunity_score": 0,
+    }
+
+
+def _is_failed(analysis: dict) -> bool:
+    return analysis.get("pain_point_summary", "").startswith("Analysis failed")
+
+
+def _format_prompt(post: dict) -> str:
+    return ANALYSIS_PROMPT.format(
         subreddit=post["subreddit"],
         title=post["title"],
         body=post["body"][:3000],
@@ -62,113 +173,329 @@ def analyze_post_claude(client, post: dict) -> dict:
         categories=", ".join(CATEGORIES),
     )
 
+
+def analyze_post_claude(client, post: dict) -> dict:
+    """Analyze a single post with Claude."""
     try:
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1024,
-            messages=[{"role": "user", "content": prompt}],
-        )
-
-        raw_text = message.content[0].text.strip()
-        if raw_text.startswith("```"):
-            raw_text = raw_text.split("\n", 1)[1] if "\n" in raw_text else raw_text[3:]
-        if raw_text.endswith("```"):
-            raw_text = raw_text[:-3]
-        raw_text = raw_text.strip()
-
-        analysis = json.loads(raw_text)
-        analysis["raw_llm_response"] = message.content[0].text
+        raw = _complete_claude(client, _format_prompt(post))
+        analysis = json.loads(_strip_fences(raw))
+        analysis["raw_llm_response"] = raw
         return analysis
 
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse Claude response for post {post['id']}: {e}")
-        return {
-            "pain_point_summary": "Analysis failed - could not parse LLM response",
-            "category": "Other", "severity": 1, "affected_audience": "Unknown",
-            "potential_solutions": [], "market_size_estimate": "Unknown",
-            "existing_solutions": [], "opportunity_score": 0,
-        }
+        return _parse_failed()
     except Exception as e:
+        if _is_rate_limited(e):
+            raise
         logger.error(f"Claude analysis failed for post {post['id']}: {e}")
         return None
 
 
 def analyze_post_gemini(client, post: dict) -> dict:
     """Analyze a single post with Gemini."""
-    prompt = ANALYSIS_PROMPT.format(
-        subreddit=post["subreddit"],
-        title=post["title"],
-        body=post["body"][:3000],
-        post_type=post["post_type"],
-        score=post["score"],
-        num_comments=post["num_comments"],
-        categories=", ".join(CATEGORIES),
-    )
-
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-        )
-
-        raw_text = response.text.strip()
-        if raw_text.startswith("```"):
-            raw_text = raw_text.split("\n", 1)[1] if "\n" in raw_text else raw_text[3:]
-        if raw_text.endswith("```"):
-            raw_text = raw_text[:-3]
-        raw_text = raw_text.strip()
-
-        analysis = json.loads(raw_text)
-        analysis["raw_llm_response"] = response.text
+        raw = _complete_gemini(client, _format_prompt(post))
+        analysis = json.loads(_strip_fences(raw))
+        analysis["raw_llm_response"] = raw
         return analysis
 
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse Gemini response for post {post['id']}: {e}")
-        return {
-            "pain_point_summary": "Analysis failed - could not parse LLM response",
-            "category": "Other", "severity": 1, "affected_audience": "Unknown",
-            "potential_solutions": [], "market_size_estimate": "Unknown",
-            "existing_solutions": [], "opportunity_score": 0,
-        }
+        return _parse_failed()
     except Exception as e:
+        if _is_rate_limited(e):
+            raise
         logger.error(f"Gemini analysis failed for post {post['id']}: {e}")
         return None
 
 
-def run_analysis(batch_size: int = 20) -> dict:
-    """Analyze unanalyzed posts."""
-    posts = get_unanalyzed_posts(limit=batch_size)
-    if not posts:
-        logger.info("No unanalyzed posts found.")
-        return {"analyzed": 0, "failed": 0}
+def _fake_analysis(title: str, subreddit: str, text: str) -> dict:
+    digest = zlib.crc32(text.encode())
+    analysis = {
+        "pain_point_summary": f"[fake] {title[:120]}",
+        "category": CATEGORIES[digest % len(CATEGORIES)],
+        "severity": digest % 5 + 1,
+        "affected_audience": f"r/{subreddit} users",
+        "potential_solutions": [],
+        "market_size_estimate": "Unknown",
+        "existing_solutions": [],
+        "opportunity_score": digest % 100 + 1,
+    }
+    analysis["raw_llm_response"] = json.dumps(analysis)
+    return analysis
+
+
+def analyze_post_fake(client, post: dict) -> dict:
+    """Offline stand-in for an LLM call, used to exercise throughput without API keys."""
+    time.sleep(FAKE_LLM_LATENCY)
+    return _fake_analysis(post["title"], post["subreddit"], f"{post['title']} {post['body']}")
 
-    provider = get_provider()
-    logger.info(f"Using LLM provider: {provider}")
 
+def _complete_fake(client, prompt: str, max_tokens: int = 1024) -> str:
+    """Answer a batch prompt offline with one fake analysis per post block."""
+    time.sleep(FAKE_LLM_LATENCY)
+    results = []
+    for block in re.split(r"^### Post ", prompt, flags=re.MULTILINE)[1:]:
+        post_id = block.split("\n", 1)[0].strip()
+        title = re.search(r"\*\*Title:\*\* (.*)", block)
+        subreddit = re.search(r"\*\*Subreddit:\*\* r/(.*)", block)
+        analysis = _fake_analysis(title.group(1) if title else "", subreddit.group(1) if subreddit else "", block)
+        del analysis["raw_llm_response"]
+        results.append({"post_id": post_id, **analysis})
+    return json.dumps(results)
+
+
+ANALYZE_FNS = {"claude": analyze_post_claude, "gemini": analyze_post_gemini, "fake": analyze_post_fake}
+COMPLETE_FNS = {"claude": _complete_claude, "gemini": _complete_gemini, "fake": _complete_fake}
+
+
+def get_client(provider: str):
+    """Return the SDK client for a provider (None for the fake provider)."""
     if provider == "claude":
         import anthropic
-        client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-        analyze_fn = analyze_post_claude
-    else:
+        return anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    elif provider == "gemini":
         from google import genai
-        client = genai.Client(api_key=GOOGLE_API_KEY)
-        analyze_fn = analyze_post_gemini
+        return genai.Client(api_key=GOOGLE_API_KEY)
+    return None
+
+
+def get_rate_limiter(provider: str) -> TokenBucket:
+    per_minute = LLM_REQUESTS_PER_MINUTE or PROVIDER_RATE_LIMITS[provider]
+    return TokenBucket(rate=per_minute / 60, capacity=max(1, per_minute // 60))
+
 
-    stats = {"analyzed": 0, "failed": 0}
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used to size prompt batches."""
+    return len(text) // 4 + 1
 
+
+def _format_batch_post(post: dict) -> str:
+    return BATCH_POST_TEMPLATE.format(
+        post_id=post["id"],
+        subreddit=post["subreddit"],
+        title=post["title"],
+        body=post["body"][:3000],
+        post_type=post["post_type"],
+        score=post["score"],
+        num_comments=post["num_comments"],
+    )
+
+
+def plan_batches(posts: list[dict], token_budget: int = BATCH_TOKEN_BUDGET,
+                 max_posts: int = BATCH_MAX_POSTS) -> list[list[dict]]:
+    """Greedily pack posts into batches whose prompts fit the token budget."""
+    budget = token_budget - estimate_tokens(BATCH_ANALYSIS_PROMPT)
+    batches, current, used = [], [], 0
     for post in posts:
-        logger.info(f"Analyzing: {post['title'][:60]}...")
-        analysis = analyze_fn(client, post)
+        cost = estimate_tokens(_format_batch_post(post))
+        if current and (used + cost > budget or len(current) >= max_posts):
+            batches.append(current)
+            current, used = [], 0
+        current.append(post)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def analyze_batch(complete_fn, client, posts: list[dict]) -> dict:
+    """Analyze several posts in one request. Returns {post_id: analysis}.
+
+    Posts the model skipped or mangled are simply absent from the result.
+    """
+    prompt = BATCH_ANALYSIS_PROMPT.format(
+        posts="\n".join(_format_batch_post(p) for p in posts),
+        categories=", ".join(CATEGORIES),
+    )
+    raw = complete_fn(client, prompt, max_tokens=BATCH_OUTPUT_TOKENS_PER_POST * len(posts))
+    try:
+        items = json.loads(_strip_fences(raw))
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse batch response for {len(posts)} posts: {e}")
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    wanted = {p["id"] for p in posts}
+    results = {}
+    for item in items:
+        post_id = str(item.pop("post_id", "")) if isinstance(item, dict) else ""
+        if post_id in wanted:
+            item["raw_llm_response"] = json.dumps(item)
+            results[post_id] = item
+    return results
+
+
+def call_with_retry(call, limiter: TokenBucket, label: str):
+    """Run call() under the shared rate limit, backing off on 429s."""
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            return call()
+        except Exception as e:
+            if not _is_rate_limited(e):
+                logger.error(f"Analysis failed for {label}: {e}")
+                return None
+            if attempt == MAX_RETRIES:
+                logger.error(f"Rate limited on {label}, giving up after {attempt + 1} attempts")
+                return None
+            delay = _retry_after(e) or (2 ** attempt) + random.uniform(0, 1)
+            logger.warning(f"Rate limited on {label}, retrying in {delay:.1f}s")
+            limiter.pause(delay)
+    return None
 
-        if analysis:
-            insert_analysis(post["id"], analysis)
-            stats["analyzed"] += 1
-        else:
-            stats["failed"] += 1
 
-        time.sleep(0.5)
+def analyze_posts(posts: list[dict], provider: str = None,
+                  concurrency: int = ANALYSIS_CONCURRENCY,
+                  strategy: str = ANALYSIS_STRATEGY,
+                  cache: AnalysisCache = None) -> dict:
+    """Analyze posts on a pool of worker threads and store the results in batches.
+
+    Posts whose content is already in the analysis cache reuse the stored
+    analysis without an LLM call. With strategy="batched", posts are packed
+    into multi-post prompts; any post missing from a batch response is
+    re-queued on its own.
+    """
+    return analyze_stream([posts], provider, concurrency, strategy, cache)
+
+
+def _relevance_filter():
+    """The trained relevance pre-filter, or None when disabled or untrained."""
+    if not RELEVANCE_FILTER:
+        return None
+    from relevance import RelevanceModel
+    return RelevanceModel.load()
+
+
+def score_backlog() -> int:
+    """Score unscored backlog posts with the relevance model, if there is one,
+    so their priority reflects it; returns how many it dropped."""
+    relevance = _relevance_filter()
+    return relevance.score_backlog() if relevance else 0
+
+
+def cluster_analyses() -> int:
+    """Assign new analyses to pain point clusters, unless disabled; returns
+    how many were assigned."""
+    if not CLUSTER_NEW_ANALYSES:
+        return 0
+    from clustering import cluster_new
+    return cluster_new()["assigned"]
+
+
+def analyze_stream(chunks: Iterable[list[dict]], provider: str = None,
+                   concurrency: int = ANALYSIS_CONCURRENCY,
+                   strategy: str = ANALYSIS_STRATEGY,
+                   cache: AnalysisCache = None) -> dict:
+    """Like analyze_posts, but for posts that arrive over time.
+
+    `chunks` yields lists of posts, and may block while waiting for more; an
+    empty list just gives finished requests a chance to be stored. At most
+    2 * concurrency requests are in flight, and the next chunk isn't pulled
+    until one of them finishes, which pushes back on the producer.
+
+    Posts without a cached analysis are scored by the relevance model, if
+    one has been trained, and those below its threshold are skipped.
+    """
+    cache = cache or AnalysisCache()
+    relevance = _relevance_filter()
+    stats = {"analyzed": 0, "failed": 0, "requests": 0, "skipped_irrelevant": 0, **cache.stats()}
+    llm = {}
+
+    def run_job(job: list[dict]) -> dict:
+        client, analyze_fn, complete_fn, limiter = llm["client"], llm["analyze"], llm["complete"], llm["limiter"]
+        if len(job) == 1:
+            post = job[0]
+            analysis = call_with_retry(lambda: analyze_fn(client, post), limiter, f"post {post['id']}")
+            return {post["id"]: analysis}
+        return call_with_retry(lambda: analyze_batch(complete_fn, client, job),
+                               limiter, f"batch of {len(job)}") or {}
+
+    def start_llm():
+        # Set up the provider only once some post actually needs it
+        name = provider or get_provider()
+        logger.info(f"Using LLM provider: {name} ({concurrency} workers, {strategy})")
+        llm.update(name=name, client=get_client(name), analyze=ANALYZE_FNS[name],
+                   complete=COMPLETE_FNS[name], limiter=get_rate_limiter(name))
+
+    pending = []
+    fresh = []
+
+    def flush():
+        insert_analyses_bulk(pending)
+        # Canned offline analyses must never be served to a later real run
+        if llm.get("name") != "fake":
+            cache.store_many([(post, analysis) for post, analysis in fresh if not _is_failed(analysis)])
+        pending.clear()
+        fresh.clear()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {}
+
+        def collect(timeout):
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = futures.pop(future)
+                results = future.result()
+                stats["requests"] += 1
+                for post in job:
+                    analysis = results.get(post["id"])
+                    if analysis:
+                        logger.info(f"Analyzed: {post['title'][:60]}...")
+                        pending.append((post["id"], analysis))
+                        fresh.append((post, analysis))
+                        stats["analyzed"] += 1
+                    elif len(job) > 1:
+                        futures[pool.submit(run_job, [post])] = [post]
+                    else:
+                        stats["failed"] += 1
+            if len(pending) >= WRITE_BATCH_SIZE:
+                flush()
+
+        for posts in chunks:
+            cached = cache.lookup_many(posts) if posts else {}
+            if cached:
+                insert_analyses_bulk(list(cached.items()))
+                stats["analyzed"] += len(cached)
+                logger.info(f"Reused {len(cached)} cached analyses")
+            posts = [post for post in posts if post["id"] not in cached]
+            if posts and relevance:
+                posts, skipped = relevance.filter(posts)
+                stats["skipped_irrelevant"] += len(skipped)
+            if posts and not llm:
+                start_llm()
+            jobs = plan_batches(posts) if strategy == "batched" else [[post] for post in posts]
+            for job in jobs:
+                futures[pool.submit(run_job, job)] = job
+            collect(timeout=0)
+            while len(futures) >= 2 * concurrency:
+                collect(timeout=None)
+        while futures:
+            collect(timeout=None)
+
+    if pending:
+        flush()
+    stats.update(cache.stats())
+    return stats
+
+
+def run_analysis(batch_size: int = 20, concurrency: int = ANALYSIS_CONCURRENCY,
+                 strategy: str = ANALYSIS_STRATEGY) -> dict:
+    """Claim and analyze the highest-priority unanalyzed posts."""
+    skipped = score_backlog()
+    posts = claim_posts(f"{socket.gethostname()}:{os.getpid()}", batch_size, ANALYSIS_LEASE_SECONDS)
+    if not posts:
+        logger.info("No unanalyzed posts found.")
+        return {"analyzed": 0, "failed": 0, "requests": 0, "skipped_irrelevant": skipped}
+
+    stats = analyze_posts(posts, concurrency=concurrency, strategy=strategy)
+    stats["skipped_irrelevant"] += skipped
+    stats["clustered"] = cluster_analyses()
 
-    logger.info(f"Analysis complete: {stats['analyzed']} analyzed, {stats['failed']} failed")
+    logger.info(f"Analysis complete: {stats['analyzed']} analyzed, {stats['failed']} failed, "
+                f"{stats['requests']} LLM requests, {stats['skipped_irrelevant']} skipped as irrelevant")
     return stats
 
 
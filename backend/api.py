@@ -1,20 +1,49 @@
 """FastAPI REST API for the pain point dashboard."""
 import json
 import csv
+import hashlib
 import io
 import logging
 import threading
-from fastapi import FastAPI, Query, Response
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from config import RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, EMBEDDED_WORKER, API_JSON_ENCODER
 from database import (
-    init_db, get_pain_points, get_pain_point_by_id,
-    get_stats, get_trending,
+    init_db, get_pain_points, iter_pain_points, get_pain_point_by_id,
+    get_stats, get_category_stats, get_subreddit_stats, get_trending,
+    get_data_version, get_jobs, get_job, count_unanalyzed_posts, project_fields,
+    get_clusters, get_cluster, get_cluster_members,
 )
+from jobs import Worker, enqueue_pipeline, describe_job
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Reddit Pain Point Discovery", version="1.0.0")
+if API_JSON_ENCODER == "orjson":
+    import orjson
+
+    def dump_json(obj) -> bytes:
+        # orjson handles dicts, lists and scalars itself; anything else goes
+        # through FastAPI's encoder
+        return orjson.dumps(obj, default=jsonable_encoder)
+else:
+    def dump_json(obj) -> bytes:
+        return json.dumps(jsonable_encoder(obj)).encode()
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+
+app = FastAPI(title="Reddit Pain Point Discovery", version="1.0.0",
+              default_response_class=ORJSONResponse if API_JSON_ENCODER == "orjson" else JSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,18 +53,110 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Track scraper status
-scraper_status = {"running": False, "last_result": None}
+worker = Worker() if EMBEDDED_WORKER else None
+
+
+class ResponseCache:
+    """LRU cache of serialized JSON responses with a TTL.
+
+    Entries are tagged with the database data_version they were built from
+    and dropped as soon as a scrape or analysis commits a newer one.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[int, float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: int):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            entry_version, stored_at, body = entry
+            if entry_version != version or time.monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return body
+
+    def set(self, key: str, version: int, body: bytes):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self.entries[key] = (version, time.monotonic(), body)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def _build_token() -> str:
+    """Digest of the backend's source, so a deploy that changes what a
+    response looks like also changes every ETag."""
+    digest = hashlib.sha1()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:8]
+
+
+BUILD_TOKEN = _build_token()
+
+
+def cached_json(request: Request, build) -> Response:
+    """Serve build()'s result through response_cache, answering 304 when the
+    client's If-None-Match still matches the current data version."""
+    key = f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+    version = get_data_version()
+    etag = f'"{BUILD_TOKEN}-{version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    body = response_cache.get(key, version)
+    if body is None:
+        body = build()
+        if not isinstance(body, bytes):
+            body = dump_json(body)
+        response_cache.set(key, version, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def json_items(items: list[str], **fields) -> bytes:
+    """A JSON object body: the pre-serialized `items` rows plus other fields."""
+    body = b'{"items": [' + ",".join(items).encode() + b"]"
+    return body + (b", " + dump_json(fields)[1:] if fields else b"}")
+
+
+def parse_fields(fields: str | None) -> list[str] | None:
+    """Split a comma-separated `fields` parameter."""
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else None
 
 
 @app.on_event("startup")
 def startup():
     init_db()
     logger.info("Database initialized.")
+    if worker:
+        worker.start()
+        logger.info(f"Embedded job worker started ({worker.threads} threads).")
+
+
+@app.on_event("shutdown")
+def shutdown():
+    if worker:
+        worker.stop()
 
 
 @app.get("/api/pain-points")
 def list_pain_points(
+    request: Request,
     subreddit: str = None,
     category: str = None,
     min_score: int = None,
@@ -44,129 +165,248 @@ def list_pain_points(
     limit: int = Query(default=50, le=200),
     offset: int = 0,
     search: str = None,
+    cursor: str = None,
+    include_total: bool = True,
+    keyword: str = None,
+    existing_solution: str = None,
+    view: str = "card",
+    fields: str = None,
 ):
-    items, total = get_pain_points(
-        subreddit=subreddit,
-        category=category,
-        min_score=min_score,
-        sort_by=sort_by,
-        order=order,
-        limit=limit,
-        offset=offset,
-        search=search,
-    )
-    # Parse JSON fields
-    for item in items:
-        for field in ["potential_solutions", "existing_solutions"]:
-            if isinstance(item.get(field), str):
-                try:
-                    item[field] = json.loads(item[field])
-                except (json.JSONDecodeError, TypeError):
-                    item[field] = []
-    return {"items": items, "total": total, "limit": limit, "offset": offset}
+    """Items carry the `view` projection ("card", "detail" or "export"), or
+    only `fields`, a comma-separated list of keys (id is always included)."""
+    def build():
+        try:
+            items, total, next_cursor = get_pain_points(
+                subreddit=subreddit,
+                category=category,
+                min_score=min_score,
+                sort_by=sort_by,
+                order=order,
+                limit=limit,
+                offset=offset,
+                search=search,
+                cursor=cursor,
+                include_total=include_total,
+                keyword=keyword,
+                existing_solution=existing_solution,
+                as_json=True,
+                fields=parse_fields(fields),
+                view=view,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return json_items(items, total=total, limit=limit, offset=offset, next_cursor=next_cursor)
+
+    # Only the first page is cached; deeper pages are cheap keyset seeks
+    if cursor is None and offset == 0:
+        return cached_json(request, build)
+    return Response(content=build(), media_type="application/json")
 
 
 @app.get("/api/pain-points/{post_id}")
-def get_pain_point(post_id: str):
-    item = get_pain_point_by_id(post_id)
+def get_pain_point(post_id: str, view: str = "detail", fields: str = None):
+    try:
+        item = get_pain_point_by_id(post_id, as_json=True, fields=parse_fields(fields), view=view)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not item:
         return {"error": "Not found"}, 404
-    for field in ["potential_solutions", "existing_solutions"]:
-        if isinstance(item.get(field), str):
-            try:
-                item[field] = json.loads(item[field])
-            except (json.JSONDecodeError, TypeError):
-                item[field] = []
-    return item
+    return Response(content=item, media_type="application/json")
 
 
 @app.get("/api/stats")
-def stats():
-    return get_stats()
+def stats(request: Request):
+    return cached_json(request, get_stats)
 
 
 @app.get("/api/trending")
-def trending(limit: int = Query(default=10, le=50)):
-    items = get_trending(limit=limit)
-    for item in items:
-        for field in ["potential_solutions", "existing_solutions"]:
-            if isinstance(item.get(field), str):
-                try:
-                    item[field] = json.loads(item[field])
-                except (json.JSONDecodeError, TypeError):
-                    item[field] = []
-    return {"items": items}
+def trending(request: Request, limit: int = Query(default=10, le=50), view: str = "card", fields: str = None):
+    def build():
+        try:
+            return json_items(get_trending(limit=limit, as_json=True, fields=parse_fields(fields), view=view))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return cached_json(request, build)
 
 
 @app.get("/api/categories")
-def categories():
-    st = get_stats()
-    return {"categories": st["categories"]}
+def categories(request: Request):
+    return cached_json(request, lambda: {"categories": get_category_stats()})
 
 
 @app.get("/api/subreddits")
-def subreddits():
-    st = get_stats()
-    return {"subreddits": st["subreddits"]}
+def subreddits(request: Request):
+    return cached_json(request, lambda: {"subreddits": get_subreddit_stats()})
 
 
-@app.get("/api/export")
-def export(format: str = "json"):
-    items, _ = get_pain_points(limit=10000, offset=0)
+@app.get("/api/clusters")
+def clusters(
+    request: Request,
+    limit: int = Query(default=20, le=200),
+    min_size: int = 2,
+    sort_by: str = "size",
+    category: str = None,
+):
+    """Pain point clusters, sorted by "size", "opportunity" or "engagement"."""
+    return cached_json(request, lambda: {"items": get_clusters(
+        limit=limit, min_size=min_size, sort_by=sort_by, category=category)})
+
+
+@app.get("/api/clusters/{cluster_id}")
+def cluster(
+    request: Request,
+    cluster_id: int,
+    limit: int = Query(default=50, le=200),
+    view: str = "card",
+    fields: str = None,
+):
+    """A cluster's aggregates plus its pain points, highest opportunity first."""
+    def build():
+        summary = get_cluster(cluster_id)
+        if not summary:
+            raise HTTPException(status_code=404, detail="Cluster not found")
+        try:
+            items = get_cluster_members(cluster_id, limit=limit, as_json=True,
+                                        fields=parse_fields(fields), view=view)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return json_items(items, cluster=summary)
+
+    return cached_json(request, build)
+
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _csv_lines(items):
+    output = io.StringIO()
+    writer = None
     for item in items:
-        for field in ["potential_solutions", "existing_solutions"]:
-            if isinstance(item.get(field), str):
-                try:
-                    item[field] = json.loads(item[field])
-                except (json.JSONDecodeError, TypeError):
-                    item[field] = []
-
-    if format == "csv":
-        output = io.StringIO()
-        if items:
-            writer = csv.DictWriter(output, fieldnames=items[0].keys())
+        if writer is None:
+            writer = csv.DictWriter(output, fieldnames=item.keys())
             writer.writeheader()
-            for item in items:
-                row = {k: json.dumps(v) if isinstance(v, list) else v for k, v in item.items()}
-                writer.writerow(row)
-        return Response(
-            content=output.getvalue(),
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=pain_points.csv"},
-        )
-    return {"items": items, "count": len(items)}
+        # Solution lists are stored as JSON text, which is what the CSV wants
+        writer.writerow(item)
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate()
+
+
+def _ndjson_lines(items):
+    for item in items:
+        yield item + "\n"
+
+
+def _json_lines(items):
+    count = 0
+    yield '{"items": ['
+    for item in items:
+        yield ("," if count else "") + item
+        count += 1
+    yield f'], "count": {count}}}'
+
+
+def _chunked(lines, gzip: bool):
+    """Group lines into ~EXPORT_CHUNK_BYTES chunks, gzipping them if asked."""
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    parts, size = [], 0
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            chunk = "".join(parts).encode()
+            yield compressor.compress(chunk) if compressor else chunk
+            parts, size = [], 0
+    chunk = "".join(parts).encode()
+    if compressor:
+        yield compressor.compress(chunk) + compressor.flush()
+    elif chunk:
+        yield chunk
+
+
+@app.get("/api/export")
+def export(
+    format: str = "json",
+    subreddit: str = None,
+    category: str = None,
+    min_score: int = None,
+    sort_by: str = "opportunity_score",
+    order: str = "desc",
+    search: str = None,
+    keyword: str = None,
+    existing_solution: str = None,
+    view: str = "export",
+    fields: str = None,
+    gzip: bool = False,
+):
+    """Stream every matching pain point as JSON, NDJSON or CSV."""
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    field_names = parse_fields(fields)
+    try:
+        # Checked up front: the query itself only runs once streaming has begun
+        project_fields(field_names, view)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items = iter_pain_points(
+        subreddit=subreddit,
+        category=category,
+        min_score=min_score,
+        sort_by=sort_by,
+        order=order,
+        search=search,
+        keyword=keyword,
+        existing_solution=existing_solution,
+        # CSV keeps the solution lists as JSON text; the JSON formats get rows
+        # already serialized by SQLite
+        as_json=format != "csv",
+        fields=field_names,
+        view=view,
+    )
+    lines = {"csv": _csv_lines, "ndjson": _ndjson_lines, "json": _json_lines}[format](items)
+    filename = f"pain_points.{format}"
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        _chunked(lines, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
 
 @app.post("/api/scrape")
-def trigger_scrape():
-    if scraper_status["running"]:
+def trigger_scrape(public: bool = False):
+    """Queue a scrape plus an analysis that drains everything it finds."""
+    queued = enqueue_pipeline(scrape_params={"public": public})
+    if not queued:
         return {"status": "already_running"}
-
-    def _run():
-        scraper_status["running"] = True
-        try:
-            from scraper import run_scrape
-            from analyzer import run_analysis
-            scrape_result = run_scrape()
-            analysis_result = run_analysis(batch_size=50)
-            scraper_status["last_result"] = {
-                "scrape": scrape_result,
-                "analysis": analysis_result,
-            }
-        except Exception as e:
-            logger.error(f"Scrape failed: {e}")
-            scraper_status["last_result"] = {"error": str(e)}
-        finally:
-            scraper_status["running"] = False
-
-    thread = threading.Thread(target=_run, daemon=True)
-    thread.start()
-    return {"status": "started"}
+    return {"status": "queued", "jobs": queued}
 
 
 @app.get("/api/scrape/status")
 def scrape_status():
-    return scraper_status
+    jobs = [describe_job(job) for job in get_jobs(limit=10)]
+    return {
+        "running": any(job["status"] in ("queued", "running") for job in jobs),
+        "backlog": count_unanalyzed_posts(),
+        "jobs": jobs,
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return describe_job(job)
 
 
 if __name__ == "__main__":
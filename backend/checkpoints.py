@@ -0,0 +1,80 @@
+"""Per-subreddit, per-feed high-water marks for incremental scraping.
+
+Chronological feeds (/new and searches sorted by new) list the newest items
+first. Each one keeps the fullname and created_utc of the newest item a
+previous run ingested. The next run pages through the feed with `after` and
+stops as soon as it reaches that mark, because everything past it is
+already stored. Ranked feeds such as hot and top have no such order, so they
+are not checkpointed.
+"""
+from database import get_scrape_checkpoints, save_scrape_checkpoints
+
+
+class FeedCheckpoint:
+    """The stored mark for one feed, plus the newest item this run has seen."""
+
+    def __init__(self, subreddit: str, feed: str, fullname: str = None, created_utc: float = None):
+        self.subreddit = subreddit
+        self.feed = feed
+        self.fullname = fullname
+        self.created_utc = created_utc
+        self.newest: tuple[float, str] | None = None
+        self.caught_up = False  # Reached the stored mark this run
+        self.failed = False  # A page failed, so there may be a gap behind newest
+
+    @property
+    def has_mark(self) -> bool:
+        return self.created_utc is not None
+
+    def reached(self, fullname: str, created_utc: float) -> bool:
+        """True once the feed is back at (or behind) the stored mark."""
+        if not self.has_mark:
+            return False
+        return fullname == self.fullname or (created_utc or 0) < self.created_utc
+
+    def see(self, fullname: str, created_utc: float):
+        if created_utc is not None and (self.newest is None or created_utc > self.newest[0]):
+            self.newest = (created_utc, fullname)
+
+    def take_new(self, items, key):
+        """Yield items from a newest-first iterable until the mark is reached.
+
+        `key(item)` returns (fullname, created_utc). Stopping here also stops
+        a lazy listing from fetching any further pages.
+        """
+        for item in items:
+            fullname, created_utc = key(item)
+            if self.reached(fullname, created_utc):
+                self.caught_up = True
+                return
+            self.see(fullname, created_utc)
+            yield item
+
+
+class SubredditCheckpoints:
+    """All feed checkpoints for one subreddit. With full=True the stored marks
+    are ignored, so feeds are read as if for the first time."""
+
+    def __init__(self, subreddit: str, full: bool = False):
+        self.subreddit = subreddit
+        self.stored = {} if full else get_scrape_checkpoints(subreddit)
+        self.feeds: dict[str, FeedCheckpoint] = {}
+
+    def feed(self, name: str) -> FeedCheckpoint:
+        if name not in self.feeds:
+            mark = self.stored.get(name, {})
+            self.feeds[name] = FeedCheckpoint(
+                self.subreddit, name, mark.get("last_fullname"), mark.get("last_created_utc"),
+            )
+        return self.feeds[name]
+
+    def save(self, run_id: str = None):
+        """Store the newest item of every feed that was read without errors.
+
+        Call this only after the feed's posts have been written, so a crash
+        can't leave a mark pointing past posts that were never stored.
+        """
+        save_scrape_checkpoints(run_id, [
+            (cp.subreddit, cp.feed, cp.newest[1], cp.newest[0])
+            for cp in self.feeds.values() if cp.newest and not cp.failed
+        ])
@@ -3,6 +3,7 @@
 import argparse
 import logging
 import sys
+from functools import partial
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,16 +12,24 @@ logging.basicConfig(
 )
 
 
-def cmd_scrape(args):
-    from database import init_db
-    init_db()
+def _scraper(args):
+    """The scraper picked by --public/--async, with the CLI arguments bound."""
     subreddits = args.subreddits.split(",") if args.subreddits else None
+    if args.public and args.use_async:
+        from scraper_public import scrape_all_public_async
+        return partial(scrape_all_public_async, subreddits=subreddits, limit=args.limit, full=args.full)
     if args.public:
         from scraper_public import scrape_all_public
-        result = scrape_all_public(subreddits=subreddits, limit=args.limit)
-    else:
-        from scraper import run_scrape
-        result = run_scrape(subreddits=subreddits, limit=args.limit)
+        return partial(scrape_all_public, subreddits=subreddits, limit=args.limit, full=args.full)
+    from scraper import run_scrape
+    return partial(run_scrape, subreddits=subreddits, limit=args.limit, concurrency=args.workers,
+                   full=args.full)
+
+
+def cmd_scrape(args):
+    from database import init_db
+    init_db()
+    result = _scraper(args)()
     print(f"\n✅ Scrape complete: {result}")
 
 
@@ -28,14 +37,23 @@ def cmd_analyze(args):
     from database import init_db
     from analyzer import run_analysis
     init_db()
-    result = run_analysis(batch_size=args.batch_size)
+    result = run_analysis(batch_size=args.batch_size, concurrency=args.concurrency,
+                          strategy=args.strategy)
     print(f"\n✅ Analysis complete: {result}")
 
 
 def cmd_run(args):
-    """Scrape then analyze."""
-    cmd_scrape(args)
-    cmd_analyze(args)
+    """Scrape then analyze, or with --stream analyze posts as they are scraped."""
+    if not args.stream:
+        cmd_scrape(args)
+        cmd_analyze(args)
+        return
+    from database import init_db
+    from pipeline import run_pipeline
+    init_db()
+    result = run_pipeline(_scraper(args), concurrency=args.concurrency, strategy=args.strategy)
+    print(f"\n✅ Scrape complete: {result['scrape']}")
+    print(f"✅ Analysis complete: {result['analysis']}")
 
 
 def cmd_serve(args):
@@ -73,7 +91,101 @@ def cmd_stats(args):
         print(f"     r/{s['subreddit']}: {s['cnt']}")
 
 
+def cmd_rebuild_stats(args):
+    """Recompute the stats summary table from posts + analyses."""
+    from database import init_db, get_db, rebuild_stats
+    init_db()
+    with get_db() as conn:
+        rebuild_stats(conn)
+    print("\n✅ Stats summary rebuilt.")
+
+
+def cmd_rescore_trending(args):
+    """Recompute trending scores (only missing ones unless --all)."""
+    from database import init_db, get_db, rescore_trending
+    init_db()
+    with get_db() as conn:
+        count = rescore_trending(conn, full=args.all)
+    print(f"\n✅ Rescored {count} pain points.")
+
+
+def cmd_vacuum(args):
+    """Move inline bodies to cold storage (init_db does this) and compact the file."""
+    from database import init_db, vacuum_db
+    init_db()
+    before, after = vacuum_db()
+    print(f"\n✅ Database compacted: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+
+def cmd_cluster(args):
+    """Assign new analyses to pain point clusters, or with --rebuild recluster all of them."""
+    from database import init_db, refresh_cluster_stats, get_clusters
+    from clustering import cluster_new, rebuild
+    init_db()
+    if args.rebuild:
+        result = rebuild()
+    else:
+        result = cluster_new()
+        # Members' scores may have been re-scraped since their cluster last changed
+        refresh_cluster_stats()
+    print(f"\n✅ Clustered {result['assigned']} new analyses, reclustered {result['reclustered']} "
+          f"({result['clusters']} clusters)")
+    for cluster in get_clusters(limit=args.top):
+        print(f"   {cluster['size']:>5}  {' '.join(cluster['label'].split())[:100]}")
+
+
+def cmd_worker(args):
+    """Run queued scrape/analyze jobs."""
+    from database import init_db
+    from jobs import Worker
+    init_db()
+    kinds = args.kinds.split(",") if args.kinds else None
+    worker = Worker(kinds=kinds, threads=args.threads, once=args.once)
+    print(f"👷 Job worker {worker.name} running {', '.join(worker.kinds)} jobs on {args.threads} threads")
+    worker.run()
+
+
+def _print_relevance_metrics(label: str, metrics: dict):
+    print(f"   {label}: {metrics['posts']} posts, {metrics['positive_rate']:.0%} real pain points")
+    print(f"     Precision:      {metrics['precision']:.1%}")
+    print(f"     Recall:         {metrics['recall']:.1%}")
+    print(f"     Calls avoided:  {metrics['calls_avoided']} ({metrics['calls_avoided_rate']:.0%})")
+
+
+def cmd_train_relevance(args):
+    """Train the pre-LLM relevance classifier on stored analyses."""
+    from database import init_db
+    from relevance import train
+    init_db()
+    try:
+        metrics = train(target_recall=args.recall)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"\n✅ Relevance model trained on {metrics['train_posts']} posts.")
+    _print_relevance_metrics("Holdout", metrics["holdout"])
+
+
+def cmd_relevance_report(args):
+    """Evaluate the stored relevance classifier against every stored analysis."""
+    from database import init_db, count_skipped_irrelevant
+    from relevance import report
+    init_db()
+    result = report()
+    if not result:
+        print("No relevance model yet; run `python cli.py train-relevance` first.")
+        return
+    print(f"\n🎯 Relevance model (threshold {result['threshold']}):")
+    _print_relevance_metrics("Holdout at training", result["trained"]["holdout"])
+    _print_relevance_metrics("All stored analyses", result["stored_data"])
+    print(f"   Pending posts skipped as irrelevant: {count_skipped_irrelevant()}")
+
+
 def main():
+    from config import (
+        ANALYSIS_CONCURRENCY, ANALYSIS_STRATEGY, SCRAPE_CONCURRENCY, JOB_WORKER_THREADS,
+        RELEVANCE_TARGET_RECALL,
+    )
     parser = argparse.ArgumentParser(description="Reddit Pain Point Discovery Tool")
     sub = parser.add_subparsers(dest="command")
 
@@ -82,17 +194,39 @@ def main():
     p_scrape.add_argument("--subreddits", "-s", help="Comma-separated subreddit list")
     p_scrape.add_argument("--limit", "-l", type=int, default=50, help="Posts per subreddit")
     p_scrape.add_argument("--public", action="store_true", help="Use public API (no Reddit credentials needed)")
+    p_scrape.add_argument("--async", dest="use_async", action="store_true",
+                          help="With --public, run all subreddit searches concurrently")
+    p_scrape.add_argument("--workers", "-w", type=int, default=SCRAPE_CONCURRENCY,
+                          help="Subreddits scraped in parallel (PRAW scraper)")
+    p_scrape.add_argument("--full", action="store_true",
+                          help="Ignore feed checkpoints and re-read every feed from the top")
 
     # analyze
     p_analyze = sub.add_parser("analyze", help="Analyze unanalyzed posts with LLM")
     p_analyze.add_argument("--batch-size", "-b", type=int, default=20, help="Batch size")
+    p_analyze.add_argument("--concurrency", "-c", type=int, default=ANALYSIS_CONCURRENCY,
+                           help="Parallel LLM requests")
+    p_analyze.add_argument("--strategy", choices=["single", "batched"], default=ANALYSIS_STRATEGY,
+                           help="One post per LLM request, or several packed into one prompt")
 
     # run (scrape + analyze)
     p_run = sub.add_parser("run", help="Scrape then analyze")
     p_run.add_argument("--subreddits", "-s", help="Comma-separated subreddit list")
     p_run.add_argument("--limit", "-l", type=int, default=50, help="Posts per subreddit")
     p_run.add_argument("--batch-size", "-b", type=int, default=20, help="Batch size")
+    p_run.add_argument("--concurrency", "-c", type=int, default=ANALYSIS_CONCURRENCY,
+                       help="Parallel LLM requests")
+    p_run.add_argument("--strategy", choices=["single", "batched"], default=ANALYSIS_STRATEGY,
+                       help="One post per LLM request, or several packed into one prompt")
     p_run.add_argument("--public", action="store_true", help="Use public API (no Reddit credentials needed)")
+    p_run.add_argument("--async", dest="use_async", action="store_true",
+                       help="With --public, run all subreddit searches concurrently")
+    p_run.add_argument("--workers", "-w", type=int, default=SCRAPE_CONCURRENCY,
+                       help="Subreddits scraped in parallel (PRAW scraper)")
+    p_run.add_argument("--full", action="store_true",
+                       help="Ignore feed checkpoints and re-read every feed from the top")
+    p_run.add_argument("--stream", action="store_true",
+                       help="Analyze posts as they are scraped instead of after the scrape")
 
     # serve
     p_serve = sub.add_parser("serve", help="Start the API server")
@@ -102,6 +236,37 @@ def main():
     # stats
     sub.add_parser("stats", help="Show database stats")
 
+    # rebuild-stats
+    sub.add_parser("rebuild-stats", help="Recompute the stats summary from scratch")
+
+    # rescore-trending
+    p_rescore = sub.add_parser("rescore-trending", help="Recompute stored trending scores")
+    p_rescore.add_argument("--all", action="store_true", help="Rescore every row, not just missing ones")
+
+    # vacuum
+    sub.add_parser("vacuum", help="Move post bodies and raw LLM output to compressed storage and compact the file")
+
+    # cluster
+    p_cluster = sub.add_parser("cluster", help="Group analyses into pain point clusters")
+    p_cluster.add_argument("--rebuild", action="store_true",
+                           help="Refit the vectorizer and recluster every analysis from scratch")
+    p_cluster.add_argument("--top", type=int, default=10, help="Largest clusters to print")
+
+    # worker
+    p_worker = sub.add_parser("worker", help="Run queued scrape/analyze jobs")
+    p_worker.add_argument("--kinds", "-k", help="Comma-separated job kinds to run (default: all)")
+    p_worker.add_argument("--threads", "-t", type=int, default=JOB_WORKER_THREADS,
+                          help="Jobs run at once (2 lets a scrape and an analysis overlap)")
+    p_worker.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+
+    # train-relevance
+    p_relevance = sub.add_parser("train-relevance", help="Train the pre-LLM relevance filter on stored analyses")
+    p_relevance.add_argument("--recall", type=float, default=RELEVANCE_TARGET_RECALL,
+                             help="Share of real pain points the threshold must keep")
+
+    # relevance-report
+    sub.add_parser("relevance-report", help="Show the relevance filter's precision, recall and calls avoided")
+
     # demo
     sub.add_parser("demo", help="Load sample data (no API keys needed)")
 
@@ -110,7 +275,10 @@ def main():
         parser.print_help()
         sys.exit(1)
 
-    {"scrape": cmd_scrape, "analyze": cmd_analyze, "run": cmd_run, "serve": cmd_serve, "stats": cmd_stats, "demo": cmd_demo}[args.command](args)
+    {"scrape": cmd_scrape, "analyze": cmd_analyze, "run": cmd_run, "serve": cmd_serve, "stats": cmd_stats,
+     "rebuild-stats": cmd_rebuild_stats, "rescore-trending": cmd_rescore_trending,
+     "vacuum": cmd_vacuum, "cluster": cmd_cluster, "worker": cmd_worker, "train-relevance": cmd_train_relevance,
+     "relevance-report": cmd_relevance_report, "demo": cmd_demo}[args.command](args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,214 @@
+"""Groups analyses whose pain_point_summary describes the same problem.
+
+Each summary becomes a hashed TF-IDF vector. Word unigrams and bigrams are
+hashed (crc32) into DIM signed dimensions, weighted by 1 + log(tf) times
+their inverse document frequency, and L2-normalized, so cosine similarity
+is a dot product.
+
+Clustering is a single incremental pass. Each analysis without a cluster
+joins the cluster whose centroid is most similar, if that similarity is at
+least CLUSTER_SIMILARITY; otherwise it starts a new cluster. The search is
+exact: summaries are scored against every centroid SEARCH_BLOCK at a time
+with one matrix product, and only the clusters the block itself changes
+are rescored one summary at a time.
+
+Document frequencies are fitted by rebuild(), which also starts the
+clustering over. cluster_new() rebuilds on its own once the number of
+analyses has grown REFIT_GROWTH-fold since the last fit, so the total work
+stays linear in the number of analyses.
+"""
+import logging
+import re
+import zlib
+import numpy as np
+from config import CLUSTER_SIMILARITY
+from database import (
+    get_analysis_summaries, count_analyses, count_unclustered_analyses, get_unclustered_analyses,
+    load_cluster_model, load_clusters, reset_clusters, save_clusters, refresh_cluster_stats,
+)
+
+logger = logging.getLogger(__name__)
+
+DIM = 256
+DF_BITS = 18  # Document frequencies are counted over 2**18 hash buckets
+SEARCH_BLOCK = 256  # Summaries scored against the centroids per matrix product
+REFIT_GROWTH = 2
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def _hashes(texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """(row, crc32) for every unigram and bigram of each text."""
+    counts, hashes = [], []
+    for text in texts:
+        tokens = _TOKEN.findall((text or "").lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts.append(len(grams))
+        hashes.extend(map(zlib.crc32, map(str.encode, grams)))
+    return np.repeat(np.arange(len(texts), dtype=np.int64), counts), np.array(hashes, dtype=np.int64)
+
+
+class Vectorizer:
+    """Hashed TF-IDF over document frequencies fitted on stored summaries."""
+
+    def __init__(self, df: np.ndarray, documents: int):
+        self.df = df
+        self.documents = documents
+        self.idf = (np.log((documents + 1) / (df + 1)) + 1).astype(np.float32)
+
+    @classmethod
+    def fit(cls, texts: list[str]) -> "Vectorizer":
+        rows, hashes = _hashes(texts)
+        # Each gram counts once per document
+        keys = np.sort(rows * (1 << DF_BITS) + (hashes & ((1 << DF_BITS) - 1)))
+        keys = keys[np.diff(keys, prepend=-1) != 0]
+        df = np.bincount(keys % (1 << DF_BITS), minlength=1 << DF_BITS).astype(np.int32)
+        return cls(df, len(texts))
+
+    def transform(self, texts: list[str]) -> np.ndarray:
+        """(len(texts), DIM) float32 unit vectors; empty texts give zeros."""
+        rows, hashes = _hashes(texts)
+        keys, tf = np.unique(rows * (1 << 32) + hashes, return_counts=True)
+        rows, hashes = keys >> 32, keys & 0xFFFFFFFF
+        weights = (1 + np.log(tf)) * self.idf[hashes & ((1 << DF_BITS) - 1)]
+        weights = np.where(hashes & (1 << 31), -weights, weights)
+        dims = (hashes >> DF_BITS) % DIM
+        vectors = np.bincount(rows * DIM + dims, weights=weights, minlength=len(texts) * DIM)
+        vectors = vectors.reshape(len(texts), DIM).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def to_blob(self) -> bytes:
+        return zlib.compress(self.df.tobytes())
+
+    @classmethod
+    def load(cls) -> "Vectorizer | None":
+        row = load_cluster_model()
+        if not row:
+            return None
+        return cls(np.frombuffer(zlib.decompress(row["df"]), dtype=np.int32), row["documents"])
+
+
+class ClusterIndex:
+    """Cluster centroids as one matrix, for scoring summaries against all of them.
+
+    A centroid is the sum of its members' vectors; clusters are compared by
+    the direction of that sum.
+    """
+
+    def __init__(self, version: int, ids: list[int], sums: np.ndarray):
+        self.version = version
+        self.ids = list(ids)
+        # Row capacity grows by doubling; rows past len(ids) are unused
+        capacity = max(len(self.ids) * 2, 1024)
+        self.sums = np.zeros((capacity, DIM), dtype=np.float32)
+        self.sums[:len(self.ids)] = sums.reshape(-1, DIM)
+        norms = np.linalg.norm(self.sums, axis=1, keepdims=True)
+        self.unit = self.sums / np.maximum(norms, 1e-12)
+        self.next_id = max(self.ids, default=0) + 1
+        self.changed: set[int] = set()
+
+    @classmethod
+    def load(cls) -> "ClusterIndex":
+        version, rows = load_clusters()
+        sums = np.array([np.frombuffer(r["centroid"], dtype=np.float32) for r in rows], dtype=np.float32)
+        return cls(version, [r["id"] for r in rows], sums)
+
+    def add(self, vector: np.ndarray, position: int = -1) -> int:
+        """Add `vector` to the cluster at `position`, or to a new one; returns its position."""
+        if position < 0:
+            position = len(self.ids)
+            self.ids.append(self.next_id)
+            self.next_id += 1
+            if position == len(self.sums):
+                self.sums = np.concatenate([self.sums, np.zeros_like(self.sums)])
+                self.unit = np.concatenate([self.unit, np.zeros_like(self.unit)])
+        self.sums[position] += vector
+        self.unit[position] = self.sums[position] / max(np.linalg.norm(self.sums[position]), 1e-12)
+        self.changed.add(position)
+        return position
+
+    def assign(self, vectors: np.ndarray, threshold: float = CLUSTER_SIMILARITY) -> list[int]:
+        """Add each vector in turn to its most similar cluster, if that is at
+        least `threshold`, or else to a new one; returns their cluster ids."""
+        ids = []
+        for start in range(0, len(vectors), SEARCH_BLOCK):
+            block = vectors[start:start + SEARCH_BLOCK]
+            count = len(self.ids)
+            # Scores against the centroids as they were before the block;
+            # clusters the block changes are masked out and rescored below
+            scores = block @ self.unit[:count].T
+            touched = []
+            for k, vector in enumerate(block):
+                position, similarity = -1, -1.0
+                if count:
+                    position = int(np.argmax(scores[k]))
+                    similarity = scores[k, position]
+                if touched:
+                    rescored = self.unit[touched] @ vector
+                    best = int(np.argmax(rescored))
+                    if rescored[best] > similarity:
+                        position, similarity = touched[best], rescored[best]
+                position = self.add(vector, position if similarity >= threshold else -1)
+                if position not in touched:
+                    touched.append(position)
+                    if position < count:
+                        scores[k + 1:, position] = -np.inf
+                ids.append(self.ids[position])
+        return ids
+
+    def save(self, assignments: list[tuple[int, str]], refresh: bool = True) -> bool:
+        """Store changed centroids and (cluster_id, analysis_id) assignments;
+        False if another process changed the clusters since they were loaded."""
+        clusters = [(self.ids[i], self.sums[i].tobytes()) for i in self.changed]
+        if not save_clusters(self.version, clusters, assignments, refresh):
+            return False
+        self.version += 1
+        self.changed.clear()
+        return True
+
+
+def cluster_new(batch_size: int = 2000, vectorizer: Vectorizer = None, refresh: bool = True) -> dict:
+    """Assign every analysis without a cluster to one; returns counts
+    (including "reclustered" when this turns into a rebuild).
+
+    Without `refresh`, the aggregates of the clusters it changes are left
+    for the caller to recompute.
+    """
+    if vectorizer is None:
+        vectorizer = Vectorizer.load()
+        if not vectorizer or count_analyses() > REFIT_GROWTH * max(vectorizer.documents, 100):
+            return rebuild(batch_size)
+    index = ClusterIndex.load()
+    assigned = 0
+    while rows := get_unclustered_analyses(batch_size):
+        vectors = vectorizer.transform([row["pain_point_summary"] for row in rows])
+        cluster_ids = index.assign(vectors)
+        if not index.save([(cluster_id, row["id"]) for cluster_id, row in zip(cluster_ids, rows)], refresh):
+            logger.info("Clusters were changed by another process; reloading them")
+            index = ClusterIndex.load()
+            continue
+        assigned += len(rows)
+    if assigned:
+        logger.info(f"Clustered {assigned} analyses ({len(index.ids)} clusters)")
+    return {"assigned": assigned, "reclustered": 0, "clusters": len(index.ids)}
+
+
+def rebuild(batch_size: int = 2000) -> dict:
+    """Refit document frequencies on every stored summary and recluster them all.
+
+    Like cluster_new(), "assigned" counts the analyses that had no cluster
+    before; "reclustered" counts those that had one and were assigned again.
+    """
+    unclustered = count_unclustered_analyses()
+    summaries = get_analysis_summaries()
+    if not summaries:
+        return {"assigned": 0, "reclustered": 0, "clusters": 0}
+    vectorizer = Vectorizer.fit(summaries)
+    reset_clusters(vectorizer.to_blob(), len(summaries))
+    logger.info(f"Refitted clustering on {len(summaries)} summaries")
+    # Aggregating each batch's clusters as they grow would redo most of the
+    # work every batch; one pass at the end covers them all
+    result = cluster_new(batch_size, vectorizer, refresh=False)
+    refresh_cluster_stats()
+    assigned = min(unclustered, result["assigned"])
+    return {"assigned": assigned, "reclustered": result["assigned"] - assigned, "clusters": result["clusters"]}
@@ -15,10 +15,54 @@ REDDIT_USER_AGENT = os.getenv("REDDIT_USER_AGENT", "pain-point-discovery:v1.0")
 # LLM
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
-LLM_PROVIDER = os.getenv("LLM_PROVIDER", "auto")  # "gemini", "claude", or "auto"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "auto")  # "gemini", "claude", "fake", or "auto"
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))  # 0 = provider default
+ANALYSIS_STRATEGY = os.getenv("ANALYSIS_STRATEGY", "single")  # "single" or "batched"
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "8000"))  # Prompt tokens per batched request
+BATCH_MAX_POSTS = int(os.getenv("BATCH_MAX_POSTS", "8"))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "50000"))
+ANALYSIS_CACHE_NEAR_DUPLICATES = os.getenv("ANALYSIS_CACHE_NEAR_DUPLICATES", "1") == "1"
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))  # Seconds per call for LLM_PROVIDER=fake
+ANALYSIS_PRIORITY = os.getenv("ANALYSIS_PRIORITY", "balanced")  # Backlog order: "score", "hot" or "balanced"
+ANALYSIS_LEASE_SECONDS = float(os.getenv("ANALYSIS_LEASE_SECONDS", "600"))  # How long a claimed post stays reserved
 
 # Database
 DATABASE_PATH = os.getenv("DATABASE_PATH", str(PROJECT_ROOT / "data" / "painpoints.db"))
+INSERT_CHUNK_SIZE = int(os.getenv("INSERT_CHUNK_SIZE", "500"))  # Rows per commit on bulk ingest
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "25"))  # Rows per commit when streaming to analysis
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))  # Rows fetched per round trip on export
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))  # Pooled read-only connections
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", "2"))  # Pooled writer connections
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))  # Bytes mapped per connection
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))  # Page cache per connection
+COLD_COMPRESSION_LEVEL = int(os.getenv("COLD_COMPRESSION_LEVEL", "6"))  # zlib level for stored bodies and raw LLM output
+
+# Streaming pipeline (`cli.py run --stream`)
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "200"))  # Scraped posts waiting for analysis
+
+# Jobs
+ANALYSIS_JOB_CHUNK = int(os.getenv("ANALYSIS_JOB_CHUNK", "100"))  # Posts per chunk of an analyze job
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))  # Running jobs without a heartbeat are reclaimed
+JOB_WORKER_THREADS = int(os.getenv("JOB_WORKER_THREADS", "2"))
+EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "1") == "1"  # Run a job worker inside the API process
+
+# Relevance pre-filter (`cli.py train-relevance`)
+RELEVANCE_FILTER = os.getenv("RELEVANCE_FILTER", "1") == "1"  # Skip posts a trained model scores as irrelevant
+RELEVANCE_TARGET_RECALL = float(os.getenv("RELEVANCE_TARGET_RECALL", "0.95"))  # Share of real pain points kept
+RELEVANCE_LABEL_SCORE = int(os.getenv("RELEVANCE_LABEL_SCORE", "10"))  # opportunity_score at or below = not a pain point
+RELEVANCE_MIN_POSTS = int(os.getenv("RELEVANCE_MIN_POSTS", "200"))  # Analyzed posts needed to train
+
+# Pain point clustering (`cli.py cluster`)
+CLUSTER_SIMILARITY = float(os.getenv("CLUSTER_SIMILARITY", "0.3"))  # Cosine similarity needed to join a cluster
+CLUSTER_NEW_ANALYSES = os.getenv("CLUSTER_NEW_ANALYSES", "1") == "1"  # Cluster new analyses after each analysis run
+
+# API
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))  # Seconds; 0 disables the cache
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+BODY_SNIPPET_CHARS = int(os.getenv("BODY_SNIPPET_CHARS", "200"))  # body_snippet length; stored per post, so raising it only affects new posts
+API_JSON_ENCODER = os.getenv("API_JSON_ENCODER", "json")  # "json" (stdlib) or "orjson" (needs `pip install orjson`)
 
 # Scraping config
 DEFAULT_SUBREDDITS = [
@@ -28,6 +72,9 @@ DEFAULT_SUBREDDITS = [
 ]
 SUBREDDITS = os.getenv("SUBREDDITS", ",".join(DEFAULT_SUBREDDITS)).split(",")
 SCRAPE_LIMIT = int(os.getenv("SCRAPE_LIMIT", "50"))
+SCRAPE_MAX_PAGES = int(os.getenv("SCRAPE_MAX_PAGES", "10"))  # Pages read per checkpointed feed, at most
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))  # Subreddits scraped at once (PRAW)
+REDDIT_REQUESTS_PER_MINUTE = int(os.getenv("REDDIT_REQUESTS_PER_MINUTE", "60"))  # Shared across workers
 
 # Pain point keywords
 PAIN_KEYWORDS = [
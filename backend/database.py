@@ -1,10 +1,30 @@
 """SQLite database management."""
+import os
+import re
+import base64
+import queue
 import sqlite3
+import threading
+import time
 import uuid
 import json
+import math
+import zlib
+from functools import lru_cache
 from pathlib import Path
 from contextlib import contextmanager
-from config import DATABASE_PATH
+from typing import Iterable, Iterator
+from config import (
+    DATABASE_PATH, DB_POOL_SIZE, DB_WRITE_POOL_SIZE, DB_MMAP_SIZE, DB_CACHE_SIZE_KB,
+    INSERT_CHUNK_SIZE, STREAM_CHUNK_SIZE, EXPORT_BATCH_SIZE, ANALYSIS_PRIORITY, BODY_SNIPPET_CHARS,
+    COLD_COMPRESSION_LEVEL, RELEVANCE_FILTER,
+)
+from keywords import find_pain_keywords
+
+# Seconds of recency worth 10x engagement in the trending score. Baked into
+# the trending triggers, so changing it needs those dropped and a full
+# rescore_trending().
+TRENDING_TIMESCALE = 86400
 
 
 def get_db_path():
@@ -13,28 +33,144 @@ def get_db_path():
     return str(path)
 
 
+def _log10(x):
+    return math.log10(x) if x is not None and x > 0 else None
+
+
+def _pack(text: str | None) -> bytes | None:
+    """Compress text for the cold tables (post_bodies, analysis_raw)."""
+    return zlib.compress(text.encode(), COLD_COMPRESSION_LEVEL) if text is not None else None
+
+
+def _unpack(blob: bytes | None) -> str | None:
+    return zlib.decompress(blob).decode() if blob is not None else None
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections, each configured once on open.
+
+    Connections are handed between threads (never used by two at once), so
+    they are opened with check_same_thread=False. A connection is checked
+    with SELECT 1 before reuse and replaced if that fails; the pool resets
+    itself after a fork so children never share their parent's handles.
+    """
+
+    def __init__(self, size: int, readonly: bool = False):
+        self.size = size
+        self.readonly = readonly
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.idle: queue.LifoQueue = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(self.size)
+
+    def _connect(self) -> sqlite3.Connection:
+        path = get_db_path()
+        if self.readonly:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        try:
+            conn.execute("SELECT log10(1)")
+        except sqlite3.OperationalError:
+            # SQLite built without math functions; the trending triggers need log10
+            conn.create_function("log10", 1, _log10, deterministic=True)
+        # For SQL over the cold tables, including the search index triggers
+        conn.create_function("pack_text", 1, _pack, deterministic=True)
+        conn.create_function("unpack_text", 1, _unpack, deterministic=True)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        if self.pid != os.getpid():
+            self._reset()
+        self.slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self.idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                try:
+                    conn.execute("SELECT 1")
+                    return conn
+                except sqlite3.Error:
+                    conn.close()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, conn: sqlite3.Connection):
+        if self.pid != os.getpid():
+            return  # borrowed before a fork; closing it could drop the parent's locks
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self.idle.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self.slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_write_pool = ConnectionPool(DB_WRITE_POOL_SIZE)
+_read_pool = ConnectionPool(DB_POOL_SIZE, readonly=True)
+
+
 @contextmanager
-def get_db():
-    conn = sqlite3.connect(get_db_path())
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA foreign_keys=ON")
+def get_db(readonly: bool = False):
+    """Borrow a pooled connection; commits on success, rolls back on error.
+
+    readonly=True hands out a separate query-only connection, so API reads
+    never queue behind the writer.
+    """
+    pool = _read_pool if readonly else _write_pool
+    conn = pool.acquire()
     try:
         yield conn
         conn.commit()
     finally:
-        conn.close()
+        pool.release(conn)
+
+
+def close_db_connections():
+    """Close idle pooled connections (pending ones close when released)."""
+    _read_pool.close()
+    _write_pool.close()
 
 
 def init_db():
     with get_db() as conn:
+        has_fts = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'pain_points_fts'"
+        ).fetchone()
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'stats_summary'"
+        ).fetchone()
+        has_solutions = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'analysis_solutions'"
+        ).fetchone()
         conn.executescript("""
             CREATE TABLE IF NOT EXISTS posts (
                 id TEXT PRIMARY KEY,
                 reddit_id TEXT UNIQUE,
                 subreddit TEXT,
                 title TEXT,
-                body TEXT,
+                body_preview TEXT,  -- the first BODY_SNIPPET_CHARS of the body
                 author TEXT,
                 url TEXT,
                 score INTEGER DEFAULT 0,
@@ -43,7 +179,8 @@ def init_db():
                 post_type TEXT,
                 parent_id TEXT,
                 scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_analyzed INTEGER DEFAULT 0
+                is_analyzed INTEGER DEFAULT 0,
+                matched_keywords TEXT
             );
 
             CREATE TABLE IF NOT EXISTS analyses (
@@ -57,8 +194,21 @@ def init_db():
                 market_size_estimate TEXT,
                 existing_solutions TEXT,
                 opportunity_score INTEGER,
-                raw_llm_response TEXT,
-                analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                trending_score REAL
+            );
+
+            -- Large text kept out of posts and analyses, zlib-compressed. Lists
+            -- and scans only walk the small hot rows; these are read for a
+            -- pain point's detail, exports, analysis and the search index.
+            CREATE TABLE IF NOT EXISTS post_bodies (
+                post_id TEXT PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+                body BLOB
+            );
+
+            CREATE TABLE IF NOT EXISTS analysis_raw (
+                analysis_id TEXT PRIMARY KEY REFERENCES analyses(id) ON DELETE CASCADE,
+                raw_llm_response BLOB
             );
 
             CREATE TABLE IF NOT EXISTS scrape_runs (
@@ -68,72 +218,1220 @@ def init_db():
                 subreddits TEXT,
                 posts_found INTEGER DEFAULT 0,
                 posts_matched INTEGER DEFAULT 0,
-                status TEXT DEFAULT 'running'
+                status TEXT DEFAULT 'running',
+                source TEXT,
+                errors INTEGER DEFAULT 0,
+                stats TEXT
+            );
+
+            -- The trained pre-LLM relevance classifier (relevance.py); one row.
+            -- With RELEVANCE_FILTER, unanalyzed posts whose stored relevance is below
+            -- its threshold are skipped by analysis.
+            CREATE TABLE IF NOT EXISTS relevance_model (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                weights BLOB,
+                bias REAL,
+                threshold REAL,
+                metrics TEXT,
+                trained_at REAL
+            );
+
+            -- Groups of analyses with near-identical pain_point_summary
+            -- (clustering.py). centroid is the float32 sum of the members'
+            -- vectors; the other columns are aggregates over the members,
+            -- refreshed whenever members are added.
+            CREATE TABLE IF NOT EXISTS clusters (
+                id INTEGER PRIMARY KEY,
+                centroid BLOB,
+                size INTEGER DEFAULT 0,
+                label TEXT,  -- summary of the highest-opportunity member
+                representative_id TEXT,  -- that member's post id
+                category TEXT,  -- the members' most common category
+                score_sum INTEGER DEFAULT 0,
+                comments_sum INTEGER DEFAULT 0,
+                opportunity_avg REAL,
+                opportunity_max INTEGER,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_clusters_size ON clusters(size);
+
+            -- Document frequencies behind the clustering vectors; one row
+            CREATE TABLE IF NOT EXISTS cluster_model (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                df BLOB,
+                documents INTEGER,
+                built_at REAL
+            );
+
+            -- Background work (scrape, analyze) claimed by `cli.py worker` or the
+            -- API's embedded worker; progress is a JSON object of counters.
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT,
+                status TEXT DEFAULT 'queued',
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                created_at REAL,
+                started_at REAL,
+                heartbeat_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+
+            -- Newest item ingested from each chronological feed (/new, searches
+            -- sorted by new); incremental scrapes stop paging when they reach it.
+            CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+                subreddit TEXT,
+                feed TEXT,
+                last_fullname TEXT,
+                last_created_utc REAL,
+                run_id TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (subreddit, feed)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                content_hash TEXT PRIMARY KEY,
+                analysis TEXT,
+                minhash BLOB,
+                hits INTEGER DEFAULT 0,
+                last_used_at REAL
             );
 
+            CREATE TABLE IF NOT EXISTS analysis_cache_bands (
+                band INTEGER,
+                bucket TEXT,
+                content_hash TEXT REFERENCES analysis_cache(content_hash) ON DELETE CASCADE,
+                PRIMARY KEY (band, bucket, content_hash)
+            ) WITHOUT ROWID;
+
+            -- Small key/value table; data_version is bumped by every write that
+            -- changes what the API serves, so response caches can tell when
+            -- they are stale.
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            );
+            INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0);
+            -- Bumped by every write to clusters, so a clustering run can tell
+            -- that another process changed them since it loaded them
+            INSERT OR IGNORE INTO meta (key, value) VALUES ('cluster_version', 0);
+
+            -- Full-text index over analyzed posts, one row per analysis.
+            -- Updates and deletes look rows up by the unindexed post_id, which
+            -- scans the index; the app only ever inserts, so that is acceptable.
+            CREATE VIRTUAL TABLE IF NOT EXISTS pain_points_fts USING fts5(
+                post_id UNINDEXED, title, body, summary,
+                tokenize = 'porter unicode61'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS analyses_fts_update AFTER UPDATE OF pain_point_summary ON analyses BEGIN
+                UPDATE pain_points_fts SET summary = new.pain_point_summary WHERE post_id = new.post_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS analyses_fts_delete AFTER DELETE ON analyses BEGIN
+                DELETE FROM pain_points_fts WHERE post_id = old.post_id;
+            END;
+
+            -- Running totals behind get_stats(), one row per dimension key:
+            -- ('total', ''), ('category', <category>), ('subreddit', <subreddit>).
+            -- Kept current by the triggers below; rebuild_stats() recomputes it.
+            CREATE TABLE IF NOT EXISTS stats_summary (
+                dimension TEXT,
+                key TEXT,
+                posts INTEGER DEFAULT 0,
+                analyzed_posts INTEGER DEFAULT 0,
+                analyses INTEGER DEFAULT 0,
+                score_count INTEGER DEFAULT 0,
+                score_sum INTEGER DEFAULT 0,
+                score_max INTEGER,
+                PRIMARY KEY (dimension, key)
+            ) WITHOUT ROWID;
+
+            CREATE TRIGGER IF NOT EXISTS posts_stats_insert AFTER INSERT ON posts BEGIN
+                INSERT INTO stats_summary (dimension, key, posts, analyzed_posts)
+                VALUES ('total', '', 1, new.is_analyzed IS 1),
+                       ('subreddit', IFNULL(new.subreddit, ''), 1, new.is_analyzed IS 1)
+                ON CONFLICT (dimension, key) DO UPDATE SET
+                    posts = posts + excluded.posts,
+                    analyzed_posts = analyzed_posts + excluded.analyzed_posts;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS posts_stats_delete AFTER DELETE ON posts BEGIN
+                UPDATE stats_summary SET posts = posts - 1, analyzed_posts = analyzed_posts - (old.is_analyzed IS 1)
+                WHERE (dimension, key) IN (VALUES ('total', ''), ('subreddit', IFNULL(old.subreddit, '')));
+            END;
+
+            -- Posts never change subreddit, so only the analyzed flag is tracked
+            CREATE TRIGGER IF NOT EXISTS posts_stats_update AFTER UPDATE OF is_analyzed ON posts
+            WHEN (old.is_analyzed IS 1) != (new.is_analyzed IS 1) BEGIN
+                UPDATE stats_summary SET analyzed_posts = analyzed_posts + (new.is_analyzed IS 1) - (old.is_analyzed IS 1)
+                WHERE (dimension, key) IN (VALUES ('total', ''), ('subreddit', IFNULL(new.subreddit, '')));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS analyses_stats_insert AFTER INSERT ON analyses BEGIN
+                INSERT INTO stats_summary (dimension, key, analyses, score_count, score_sum, score_max)
+                VALUES ('total', '', 1, new.opportunity_score IS NOT NULL,
+                        IFNULL(new.opportunity_score, 0), new.opportunity_score),
+                       ('category', IFNULL(new.category, ''), 1, new.opportunity_score IS NOT NULL,
+                        IFNULL(new.opportunity_score, 0), new.opportunity_score),
+                       ('subreddit', IFNULL((SELECT subreddit FROM posts WHERE id = new.post_id), ''), 1,
+                        new.opportunity_score IS NOT NULL, IFNULL(new.opportunity_score, 0), new.opportunity_score)
+                ON CONFLICT (dimension, key) DO UPDATE SET
+                    analyses = analyses + excluded.analyses,
+                    score_count = score_count + excluded.score_count,
+                    score_sum = score_sum + excluded.score_sum,
+                    score_max = CASE WHEN score_max IS NULL OR excluded.score_max > score_max
+                                     THEN excluded.score_max ELSE score_max END;
+            END;
+
+            -- Deleting or lowering the current maximum re-reads it from the
+            -- table. The app never does either, so these paths can be slow.
+            CREATE TRIGGER IF NOT EXISTS analyses_stats_delete AFTER DELETE ON analyses BEGIN
+                UPDATE stats_summary SET
+                    analyses = analyses - 1,
+                    score_count = score_count - (old.opportunity_score IS NOT NULL),
+                    score_sum = score_sum - IFNULL(old.opportunity_score, 0)
+                WHERE (dimension, key) IN (VALUES
+                    ('total', ''), ('category', IFNULL(old.category, '')),
+                    ('subreddit', IFNULL((SELECT subreddit FROM posts WHERE id = old.post_id), '')));
+                UPDATE stats_summary SET score_max = CASE dimension
+                    WHEN 'total' THEN (SELECT MAX(opportunity_score) FROM analyses)
+                    WHEN 'category' THEN (SELECT MAX(opportunity_score) FROM analyses WHERE category IS old.category)
+                    ELSE (SELECT MAX(a.opportunity_score) FROM analyses a JOIN posts p ON p.id = a.post_id
+                          WHERE IFNULL(p.subreddit, '') = stats_summary.key)
+                END
+                WHERE score_max <= old.opportunity_score AND (dimension, key) IN (VALUES
+                    ('total', ''), ('category', IFNULL(old.category, '')),
+                    ('subreddit', IFNULL((SELECT subreddit FROM posts WHERE id = old.post_id), '')));
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS analyses_stats_update AFTER UPDATE OF category, opportunity_score ON analyses
+            WHEN old.category IS NOT new.category OR old.opportunity_score IS NOT new.opportunity_score BEGIN
+                UPDATE stats_summary SET
+                    analyses = analyses - 1,
+                    score_count = score_count - (old.opportunity_score IS NOT NULL),
+                    score_sum = score_sum - IFNULL(old.opportunity_score, 0)
+                WHERE (dimension, key) IN (VALUES
+                    ('total', ''), ('category', IFNULL(old.category, '')),
+                    ('subreddit', IFNULL((SELECT subreddit FROM posts WHERE id = old.post_id), '')));
+                INSERT INTO stats_summary (dimension, key, analyses, score_count, score_sum, score_max)
+                VALUES ('total', '', 1, new.opportunity_score IS NOT NULL,
+                        IFNULL(new.opportunity_score, 0), new.opportunity_score),
+                       ('category', IFNULL(new.category, ''), 1, new.opportunity_score IS NOT NULL,
+                        IFNULL(new.opportunity_score, 0), new.opportunity_score),
+                       ('subreddit', IFNULL((SELECT subreddit FROM posts WHERE id = new.post_id), ''), 1,
+                        new.opportunity_score IS NOT NULL, IFNULL(new.opportunity_score, 0), new.opportunity_score)
+                ON CONFLICT (dimension, key) DO UPDATE SET
+                    analyses = analyses + excluded.analyses,
+                    score_count = score_count + excluded.score_count,
+                    score_sum = score_sum + excluded.score_sum;
+                UPDATE stats_summary SET score_max = CASE dimension
+                    WHEN 'total' THEN (SELECT MAX(opportunity_score) FROM analyses)
+                    WHEN 'category' THEN (SELECT MAX(opportunity_score) FROM analyses
+                                          WHERE IFNULL(category, '') = stats_summary.key)
+                    ELSE (SELECT MAX(a.opportunity_score) FROM analyses a JOIN posts p ON p.id = a.post_id
+                          WHERE IFNULL(p.subreddit, '') = stats_summary.key)
+                END
+                WHERE (dimension, key) IN (VALUES
+                    ('total', ''), ('category', IFNULL(old.category, '')), ('category', IFNULL(new.category, '')),
+                    ('subreddit', IFNULL((SELECT subreddit FROM posts WHERE id = new.post_id), '')));
+            END;
+
             CREATE INDEX IF NOT EXISTS idx_posts_subreddit ON posts(subreddit);
-            CREATE INDEX IF NOT EXISTS idx_posts_score ON posts(score DESC);
-            CREATE INDEX IF NOT EXISTS idx_posts_analyzed ON posts(is_analyzed);
+            DROP INDEX IF EXISTS idx_posts_score;
+            DROP INDEX IF EXISTS idx_analyses_score;
+            -- (sort column, id) pairs backing keyset pagination in get_pain_points
+            CREATE INDEX IF NOT EXISTS idx_posts_score_id ON posts(score, id);
+            CREATE INDEX IF NOT EXISTS idx_posts_created_id ON posts(created_utc, id);
+            CREATE INDEX IF NOT EXISTS idx_posts_comments_id ON posts(num_comments, id);
+            -- Replaced by the partial idx_posts_backlog
+            DROP INDEX IF EXISTS idx_posts_analyzed;
+            CREATE INDEX IF NOT EXISTS idx_analyses_post ON analyses(post_id);
             CREATE INDEX IF NOT EXISTS idx_analyses_category ON analyses(category);
-            CREATE INDEX IF NOT EXISTS idx_analyses_score ON analyses(opportunity_score DESC);
+            CREATE INDEX IF NOT EXISTS idx_analyses_score_post ON analyses(opportunity_score, post_id);
+            CREATE INDEX IF NOT EXISTS idx_analyses_severity_post ON analyses(severity, post_id);
+            CREATE INDEX IF NOT EXISTS idx_analysis_cache_lru ON analysis_cache(last_used_at);
+            CREATE INDEX IF NOT EXISTS idx_analysis_cache_bands_hash ON analysis_cache_bands(content_hash);
+        """)
+        _ensure_column(conn, "posts", "body_preview", "TEXT")
+        move_to_cold_storage(conn)
+        _ensure_column(conn, "analyses", "trending_score", "REAL")
+        _ensure_column(conn, "analyses", "cluster_id", "INTEGER")
+        _ensure_column(conn, "posts", "relevance", "REAL")
+        new_priority = _ensure_column(conn, "posts", "priority", "REAL")
+        _ensure_column(conn, "posts", "lease_owner", "TEXT")
+        _ensure_column(conn, "posts", "lease_expires", "REAL")
+        _ensure_column(conn, "scrape_runs", "source", "TEXT")
+        _ensure_column(conn, "scrape_runs", "errors", "INTEGER DEFAULT 0")
+        _ensure_column(conn, "scrape_runs", "stats", "TEXT")
+        if _ensure_column(conn, "posts", "matched_keywords", "TEXT"):
+            backfill_matched_keywords(conn)
+        conn.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS analyses_fts_insert AFTER INSERT ON analyses BEGIN
+                INSERT INTO pain_points_fts (post_id, title, body, summary)
+                SELECT p.id, p.title, {POST_BODY}, new.pain_point_summary FROM posts p WHERE p.id = new.post_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title ON posts BEGIN
+                UPDATE pain_points_fts SET title = new.title WHERE post_id = new.id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS post_bodies_fts_update AFTER UPDATE OF body ON post_bodies BEGIN
+                UPDATE pain_points_fts SET body = unpack_text(new.body) WHERE post_id = new.post_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS analyses_trending_insert AFTER INSERT ON analyses BEGIN
+                UPDATE analyses SET trending_score = (
+                    SELECT {_trending_expr("p.score", "p.num_comments", "new.opportunity_score", "p.created_utc")}
+                    FROM posts p WHERE p.id = new.post_id
+                ) WHERE id = new.id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS analyses_trending_update AFTER UPDATE OF opportunity_score ON analyses BEGIN
+                UPDATE analyses SET trending_score = (
+                    SELECT {_trending_expr("p.score", "p.num_comments", "new.opportunity_score", "p.created_utc")}
+                    FROM posts p WHERE p.id = new.post_id
+                ) WHERE id = new.id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS posts_trending_update AFTER UPDATE OF score, num_comments, created_utc ON posts BEGIN
+                UPDATE analyses
+                SET trending_score = {_trending_expr("new.score", "new.num_comments", "opportunity_score", "new.created_utc")}
+                WHERE post_id = new.id;
+            END;
+
+            CREATE INDEX IF NOT EXISTS idx_analyses_trending ON analyses(trending_score);
+            -- A cluster's members, and (cluster_id IS NULL) analyses not yet clustered
+            CREATE INDEX IF NOT EXISTS idx_analyses_cluster ON analyses(cluster_id);
+
+            -- The analysis backlog in priority order. Only unanalyzed posts are
+            -- indexed, and claim_posts filters on relevance and leases without
+            -- touching the table, so a claim reads just the rows it takes.
+            CREATE INDEX IF NOT EXISTS idx_posts_backlog
+                ON posts(priority DESC, relevance, lease_expires) WHERE is_analyzed = 0;
+
+            -- One row per item of an analysis's potential_solutions and
+            -- existing_solutions. Those columns stay the JSON text the API
+            -- sends as-is; this table makes the items searchable, e.g. every
+            -- pain point where Notion is an existing solution.
+            CREATE TABLE IF NOT EXISTS analysis_solutions (
+                analysis_id TEXT REFERENCES analyses(id) ON DELETE CASCADE,
+                kind TEXT,  -- 'potential' or 'existing'
+                position INTEGER,
+                name TEXT COLLATE NOCASE,
+                PRIMARY KEY (analysis_id, kind, position)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_analysis_solutions_name ON analysis_solutions(kind, name, analysis_id);
+
+            CREATE TRIGGER IF NOT EXISTS analyses_solutions_insert AFTER INSERT ON analyses BEGIN
+                INSERT INTO analysis_solutions (analysis_id, kind, position, name)
+                {_solution_rows("new")};
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS analyses_solutions_update
+            AFTER UPDATE OF potential_solutions, existing_solutions ON analyses BEGIN
+                DELETE FROM analysis_solutions WHERE analysis_id = new.id;
+                INSERT INTO analysis_solutions (analysis_id, kind, position, name)
+                {_solution_rows("new")};
+            END;
+        """)
+        if _install_backlog_priority(conn) or new_priority:
+            rescore_backlog(conn)
+
+        if not has_fts:
+            rebuild_search_index(conn)
+        if not has_stats:
+            rebuild_stats(conn)
+        if not has_solutions:
+            rebuild_solutions(conn)
+        rescore_trending(conn)
+
+
+# A post's full body (`p` being its posts row), read from cold storage
+POST_BODY = "(SELECT unpack_text(body) FROM post_bodies WHERE post_id = p.id)"
+
+
+def move_to_cold_storage(conn: sqlite3.Connection) -> int:
+    """Move posts.body and analyses.raw_llm_response of a database created
+    before the cold tables into post_bodies and analysis_raw, compressed,
+    and drop the inline columns.
+
+    Does nothing on a database that has already been moved. The freed
+    pages stay in the file until it is vacuumed (`cli.py vacuum`). Returns
+    the number of posts moved.
+    """
+    moved = 0
+    if _has_column(conn, "posts", "body"):
+        # Both read posts.body; init_db recreates them over post_bodies
+        conn.execute("DROP TRIGGER IF EXISTS analyses_fts_insert")
+        conn.execute("DROP TRIGGER IF EXISTS posts_fts_update")
+        moved = conn.execute("INSERT OR IGNORE INTO post_bodies (post_id, body) SELECT id, pack_text(body) FROM posts"
+                             ).rowcount
+        conn.execute(f"UPDATE posts SET body_preview = substr(body, 1, {BODY_SNIPPET_CHARS})")
+        conn.execute("ALTER TABLE posts DROP COLUMN body")
+        _bump_data_version(conn)
+    if _has_column(conn, "analyses", "raw_llm_response"):
+        conn.execute("""
+            INSERT OR IGNORE INTO analysis_raw (analysis_id, raw_llm_response)
+            SELECT id, pack_text(raw_llm_response) FROM analyses WHERE IFNULL(raw_llm_response, '') != ''
         """)
+        conn.execute("ALTER TABLE analyses DROP COLUMN raw_llm_response")
+        _bump_data_version(conn)
+    conn.commit()
+    return moved
+
+
+def vacuum_db() -> tuple[int, int]:
+    """Rewrite the database file without free pages; returns its size in
+    bytes (with the WAL) before and after."""
+    path = get_db_path()
+
+    def size():
+        return sum(os.path.getsize(f) for f in (path, f"{path}-wal") if os.path.exists(f))
+
+    before = size()
+    with get_db() as conn:
+        conn.commit()  # VACUUM can't run inside a transaction
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return before, size()
+
+
+def _has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return column in {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> bool:
+    """Add a column that older databases were created without; True if added."""
+    if _has_column(conn, table, column):
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+
+def _trending_expr(score: str, num_comments: str, opportunity_score: str, created_utc: str) -> str:
+    """SQL for the trending score: log-scaled engagement plus a recency term.
+
+    Like Reddit's "hot" ranking, recency is added rather than multiplied in,
+    so a post TRENDING_TIMESCALE seconds newer needs 10x less engagement to
+    rank level. Scores never need re-decaying as time passes: the ordering
+    is the same whenever it is computed.
+    """
+    return (f"log10(MAX({score} * 2 + {num_comments} * 3 + IFNULL({opportunity_score}, 0), 1))"
+            f" + IFNULL({created_utc}, 0) / {TRENDING_TIMESCALE}.0")
+
+
+def _hot_expr(p: str) -> str:
+    return (f"log10(MAX({p}score * 2 + {p}num_comments * 3, 1))"
+            f" + IFNULL({p}created_utc, 0) / {TRENDING_TIMESCALE}.0")
+
+
+# Analysis backlog orderings: SQL for a post's priority, given the column
+# prefix ("new." in triggers). ANALYSIS_PRIORITY picks one by name. Like the
+# trending score, none of them decays, so stored priorities stay comparable.
+BACKLOG_PRIORITIES = {
+    # Upvotes only (the original order)
+    "score": lambda p: f"{p}score",
+    # Engagement plus recency, like the trending score
+    "hot": _hot_expr,
+    # "hot", plus up to 2 (100x engagement) for the relevance classifier's
+    # confidence; posts it hasn't scored count as 0.5
+    "balanced": lambda p: f"{_hot_expr(p)} + IFNULL({p}relevance, 0.5) * 2",
+}
+
+
+def _install_backlog_priority(conn: sqlite3.Connection) -> bool:
+    """(Re)create the triggers that keep posts.priority current for the backlog.
+
+    Returns True if the expression changed (ANALYSIS_PRIORITY was switched),
+    in which case stored priorities need rescore_backlog().
+    """
+    if ANALYSIS_PRIORITY not in BACKLOG_PRIORITIES:
+        raise ValueError(f"Unknown ANALYSIS_PRIORITY {ANALYSIS_PRIORITY!r}; "
+                         f"expected one of {', '.join(BACKLOG_PRIORITIES)}")
+    expr = BACKLOG_PRIORITIES[ANALYSIS_PRIORITY]("new.")
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'posts_priority_update'"
+                       ).fetchone()
+    if row and f"priority = {expr} WHERE" in row["sql"]:
+        return False
+    conn.executescript(f"""
+        DROP TRIGGER IF EXISTS posts_priority_insert;
+        DROP TRIGGER IF EXISTS posts_priority_update;
+
+        CREATE TRIGGER posts_priority_insert AFTER INSERT ON posts WHEN new.is_analyzed = 0 BEGIN
+            UPDATE posts SET priority = {expr} WHERE rowid = new.rowid;
+        END;
+
+        CREATE TRIGGER posts_priority_update AFTER UPDATE OF score, num_comments, created_utc, relevance ON posts
+        WHEN new.is_analyzed = 0 BEGIN
+            UPDATE posts SET priority = {expr} WHERE rowid = new.rowid;
+        END;
+    """)
+    return bool(row)
+
+
+def rescore_backlog(conn: sqlite3.Connection, batch_size: int = 5000) -> int:
+    """Recompute priority for every unanalyzed post, committing per rowid batch."""
+    expr = BACKLOG_PRIORITIES[ANALYSIS_PRIORITY]("")
+    updated, last_rowid = 0, 0
+    while True:
+        rowids = [r[0] for r in conn.execute(
+            "SELECT rowid FROM posts WHERE rowid > ? AND is_analyzed = 0 ORDER BY rowid LIMIT ?",
+            (last_rowid, batch_size),
+        )]
+        if not rowids:
+            return updated
+        conn.execute(f"UPDATE posts SET priority = {expr} WHERE rowid BETWEEN ? AND ? AND is_analyzed = 0",
+                     (rowids[0], rowids[-1]))
+        conn.commit()
+        updated += len(rowids)
+        last_rowid = rowids[-1]
+
+
+def rescore_trending(conn: sqlite3.Connection, full: bool = False, batch_size: int = 5000) -> int:
+    """Recompute trending_score in rowid batches, committing after each.
+
+    Triggers keep the score current on every write, so by default only rows
+    still missing a score (an older database) are filled in. full=True
+    redoes every row, e.g. after changing the formula. Returns rows updated.
+    """
+    expr = _trending_expr("p.score", "p.num_comments", "analyses.opportunity_score", "p.created_utc")
+    pending = "1=1" if full else "trending_score IS NULL"
+    updated, last_rowid = 0, 0
+    while True:
+        rowids = [r[0] for r in conn.execute(
+            f"SELECT rowid FROM analyses WHERE rowid > ? AND {pending} ORDER BY rowid LIMIT ?",
+            (last_rowid, batch_size),
+        )]
+        if not rowids:
+            return updated
+        conn.execute(f"""
+            UPDATE analyses SET trending_score = (
+                SELECT {expr} FROM posts p WHERE p.id = analyses.post_id
+            )
+            WHERE rowid BETWEEN ? AND ? AND {pending}
+        """, (rowids[0], rowids[-1]))
+        _bump_data_version(conn)
+        conn.commit()
+        updated += len(rowids)
+        last_rowid = rowids[-1]
+
+
+def rebuild_search_index(conn: sqlite3.Connection):
+    """Repopulate pain_points_fts from posts + analyses (backfills older databases)."""
+    conn.execute("DELETE FROM pain_points_fts")
+    conn.execute("""
+        INSERT INTO pain_points_fts (post_id, title, body, summary)
+        SELECT p.id, p.title, unpack_text(b.body), a.pain_point_summary
+        FROM analyses a JOIN posts p ON p.id = a.post_id
+        LEFT JOIN post_bodies b ON b.post_id = p.id
+    """)
+    conn.execute("INSERT INTO pain_points_fts (pain_points_fts) VALUES ('optimize')")
+    _bump_data_version(conn)
+
+
+def _solution_rows(analysis: str, source: str = "") -> str:
+    """SELECT of analysis_solutions rows for `analysis` (a table alias or "new"),
+    with `source` (e.g. "analyses a, ") joined in front of the item scan.
+
+    Only string items are kept; a column that isn't a JSON array adds nothing.
+    """
+    return " UNION ALL ".join(f"""
+        SELECT {analysis}.id, '{kind}', s.key, trim(s.value)
+        FROM {source}json_each(IIF(json_valid({analysis}.{field}), {analysis}.{field}, '[]')) s
+        WHERE s.type = 'text'
+    """ for field, kind in SOLUTION_FIELDS.items())
+
+
+def rebuild_solutions(conn: sqlite3.Connection):
+    """Repopulate analysis_solutions from analyses (backfills older databases)."""
+    conn.execute("DELETE FROM analysis_solutions")
+    conn.execute(f"""
+        INSERT INTO analysis_solutions (analysis_id, kind, position, name)
+        {_solution_rows("a", "analyses a, ")}
+    """)
+    _bump_data_version(conn)
+
+
+def rebuild_stats(conn: sqlite3.Connection):
+    """Recompute stats_summary from posts + analyses (backfills older databases)."""
+    conn.execute("DELETE FROM stats_summary")
+    conn.execute("""
+        INSERT INTO stats_summary (dimension, key, posts, analyzed_posts)
+        SELECT 'total', '', COUNT(*), COUNT(CASE WHEN is_analyzed = 1 THEN 1 END) FROM posts
+        UNION ALL
+        SELECT 'subreddit', IFNULL(subreddit, ''), COUNT(*), COUNT(CASE WHEN is_analyzed = 1 THEN 1 END)
+        FROM posts GROUP BY IFNULL(subreddit, '')
+    """)
+    conn.execute("""
+        INSERT INTO stats_summary (dimension, key, analyses, score_count, score_sum, score_max)
+        SELECT 'total', '', COUNT(*), COUNT(opportunity_score), IFNULL(SUM(opportunity_score), 0),
+               MAX(opportunity_score)
+        FROM analyses
+        UNION ALL
+        SELECT 'category', IFNULL(category, ''), COUNT(*), COUNT(opportunity_score),
+               IFNULL(SUM(opportunity_score), 0), MAX(opportunity_score)
+        FROM analyses GROUP BY IFNULL(category, '')
+        UNION ALL
+        SELECT 'subreddit', IFNULL(p.subreddit, ''), COUNT(*), COUNT(a.opportunity_score),
+               IFNULL(SUM(a.opportunity_score), 0), MAX(a.opportunity_score)
+        FROM analyses a JOIN posts p ON p.id = a.post_id GROUP BY IFNULL(p.subreddit, '')
+        ON CONFLICT (dimension, key) DO UPDATE SET
+            analyses = excluded.analyses,
+            score_count = excluded.score_count,
+            score_sum = excluded.score_sum,
+            score_max = excluded.score_max
+    """)
+    _bump_data_version(conn)
+
+
+def get_data_version() -> int:
+    with get_db(readonly=True) as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+    return row["value"] if row else 0
+
+
+def _bump_data_version(conn: sqlite3.Connection):
+    """Mark cached API responses stale; every write that changes what the API
+    returns calls this in its own transaction."""
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+
+
+def _keyword_text(post: dict) -> str:
+    # Comments carry their submission's title but are matched on their own body
+    if post.get("post_type") == "comment":
+        return post.get("body") or ""
+    return f"{post.get('title') or ''} {post.get('body') or ''}"
+
+
+def backfill_matched_keywords(conn: sqlite3.Connection, batch_size: int = 2000) -> int:
+    """Fill posts.matched_keywords for rows stored before it existed."""
+    updated, last_rowid = 0, 0
+    while True:
+        rows = conn.execute(
+            f"""SELECT rowid, id, title, {POST_BODY} AS body, post_type FROM posts p
+               WHERE rowid > ? AND matched_keywords IS NULL ORDER BY rowid LIMIT ?""",
+            (last_rowid, batch_size),
+        ).fetchall()
+        if not rows:
+            return updated
+        conn.executemany(
+            "UPDATE posts SET matched_keywords = ? WHERE id = ?",
+            [(json.dumps(find_pain_keywords(_keyword_text(dict(r)))), r["id"]) for r in rows],
+        )
+        _bump_data_version(conn)
+        conn.commit()
+        updated += len(rows)
+        last_rowid = rows[-1]["rowid"]
+
+
+def _post_params(post_id: str, post_data: dict) -> tuple:
+    return (
+        post_id,
+        post_data["reddit_id"],
+        post_data["subreddit"],
+        post_data.get("title", ""),
+        (post_data.get("body") or "")[:BODY_SNIPPET_CHARS],
+        post_data.get("author", "[deleted]"),
+        post_data.get("url", ""),
+        post_data.get("score", 0),
+        post_data.get("num_comments", 0),
+        post_data.get("created_utc", 0),
+        post_data.get("post_type", "submission"),
+        post_data.get("parent_id"),
+        json.dumps(post_data["matched_keywords"] if "matched_keywords" in post_data
+                   else find_pain_keywords(_keyword_text(post_data))),
+    )
+
+
+INSERT_POST_SQL = """
+    INSERT INTO posts (id, reddit_id, subreddit, title, body_preview, author, url,
+                       score, num_comments, created_utc, post_type, parent_id,
+                       matched_keywords)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+INSERT_BODY_SQL = "INSERT OR IGNORE INTO post_bodies (post_id, body) VALUES (?, ?)"
 
 
 def insert_post(post_data: dict) -> str:
     post_id = str(uuid.uuid4())
     with get_db() as conn:
-        try:
-            conn.execute("""
-                INSERT INTO posts (id, reddit_id, subreddit, title, body, author, url,
-                                   score, num_comments, created_utc, post_type, parent_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                post_id,
-                post_data["reddit_id"],
-                post_data["subreddit"],
-                post_data.get("title", ""),
-                post_data.get("body", ""),
-                post_data.get("author", "[deleted]"),
-                post_data.get("url", ""),
-                post_data.get("score", 0),
-                post_data.get("num_comments", 0),
-                post_data.get("created_utc", 0),
-                post_data.get("post_type", "submission"),
-                post_data.get("parent_id"),
-            ))
+        if conn.execute(INSERT_POST_SQL + " ON CONFLICT(reddit_id) DO NOTHING RETURNING id",
+                        _post_params(post_id, post_data)).fetchone():
+            conn.execute(INSERT_BODY_SQL, (post_id, _pack(post_data.get("body") or "")))
+            _bump_data_version(conn)
             return post_id
-        except sqlite3.IntegrityError:
-            # Already exists
-            row = conn.execute("SELECT id FROM posts WHERE reddit_id = ?",
-                             (post_data["reddit_id"],)).fetchone()
-            return row["id"] if row else ""
+        # Already exists
+        row = conn.execute("SELECT id FROM posts WHERE reddit_id = ?",
+                         (post_data["reddit_id"],)).fetchone()
+        return row["id"] if row else ""
+
+
+def insert_posts_bulk(posts: Iterable[dict], chunk_size: int = INSERT_CHUNK_SIZE) -> list[str]:
+    """Insert many posts over one connection, committing once per chunk.
+
+    Posts whose reddit_id is already stored are skipped. A post's "id" is
+    used when present, else a fresh one is generated. Returns the ids of the
+    rows that were actually inserted.
+    """
+    inserted = []
+    with get_db() as conn:
+        chunk = []
+        for post_data in posts:
+            params = _post_params(post_data.get("id") or str(uuid.uuid4()), post_data)
+            chunk.append((params, _pack(post_data.get("body") or "")))
+            if len(chunk) >= chunk_size:
+                inserted.extend(_insert_post_chunk(conn, chunk))
+                chunk = []
+        if chunk:
+            inserted.extend(_insert_post_chunk(conn, chunk))
+    return inserted
+
+
+def _insert_post_chunk(conn: sqlite3.Connection, rows: list[tuple[tuple, bytes]]) -> list[str]:
+    """Insert (post params, packed body) pairs."""
+    # executemany() discards RETURNING rows, so look the fresh ids up instead.
+    conn.executemany(
+        INSERT_POST_SQL + " ON CONFLICT(reddit_id) DO NOTHING",
+        [params for params, _ in rows],
+    )
+    ids = [params[0] for params, _ in rows]
+    placeholders = ",".join("?" * len(ids))
+    found = {
+        r["id"] for r in
+        conn.execute(f"SELECT id FROM posts WHERE id IN ({placeholders})", ids)
+    }
+    if found:
+        conn.executemany(INSERT_BODY_SQL, [(params[0], body) for params, body in rows if params[0] in found])
+        _bump_data_version(conn)
+    conn.commit()
+    return [i for i in ids if i in found]
+
+
+class PostWriter:
+    """Buffers scraped posts and writes them with insert_posts_bulk.
+
+    Use as a context manager so the tail of the buffer is flushed on exit.
+    When given a `known` set (seen.SeenIds), flushed reddit_ids are added to
+    it so later lookups skip them. When given `on_insert`, it is called with
+    the newly inserted posts (with their "id") after each flush; those
+    writers flush every STREAM_CHUNK_SIZE posts so consumers start early.
+    """
+
+    def __init__(self, chunk_size: int = None, known=None, on_insert=None):
+        self.chunk_size = chunk_size or (STREAM_CHUNK_SIZE if on_insert else INSERT_CHUNK_SIZE)
+        self.known = known
+        self.on_insert = on_insert
+        self.buffer: list[dict] = []
+        self.inserted = 0
+
+    def add(self, post_data: dict):
+        self.buffer.append(post_data)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> list[str]:
+        if not self.buffer:
+            return []
+        if self.on_insert:
+            for post in self.buffer:
+                post.setdefault("id", str(uuid.uuid4()))
+        ids = insert_posts_bulk(self.buffer, chunk_size=self.chunk_size)
+        self.inserted += len(ids)
+        if self.known is not None:
+            self.known.update(post["reddit_id"] for post in self.buffer)
+        if self.on_insert and ids:
+            inserted = set(ids)
+            self.on_insert([post for post in self.buffer if post["id"] in inserted])
+        self.buffer = []
+        return ids
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+
+def iter_reddit_ids(batch_size: int = 10000) -> Iterator[str]:
+    """Stream every stored reddit_id without materializing the whole list."""
+    with get_db(readonly=True) as conn:
+        cur = conn.execute("SELECT reddit_id FROM posts WHERE reddit_id IS NOT NULL")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0]
+
+
+def _job_row(row) -> dict:
+    job = dict(row)
+    for field in ("params", "progress", "result"):
+        job[field] = json.loads(job[field]) if job[field] else None
+    return job
+
+
+def enqueue_job(kind: str, params: dict = None, unless_active: bool = False) -> str | None:
+    """Queue a `kind` job and return its id.
+
+    With unless_active, nothing is queued (and None is returned) while a
+    `kind` job is queued or running; the check and the insert are one
+    statement, so concurrent callers can't both queue one.
+    """
+    job_id = str(uuid.uuid4())
+    guard = ("WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE kind = ?1 AND status IN ('queued', 'running'))"
+             if unless_active else "")
+    with get_db() as conn:
+        cur = conn.execute(
+            f"INSERT INTO jobs (id, kind, params, progress, created_at) SELECT ?2, ?1, ?3, '{{}}', ?4 {guard}",
+            (kind, job_id, json.dumps(params or {}), time.time()),
+        )
+        return job_id if cur.rowcount else None
+
+
+def claim_job(worker: str, kinds: list[str], stale_after: float) -> dict | None:
+    """Atomically move the oldest queued job of one of `kinds` to running.
+
+    Running jobs whose heartbeat is older than `stale_after` seconds belong
+    to a worker that died, and are claimed again.
+    """
+    now = time.time()
+    with get_db() as conn:
+        row = conn.execute("""
+            UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE kind IN (SELECT value FROM json_each(?))
+                  AND (status = 'queued' OR (status = 'running' AND heartbeat_at < ?))
+                ORDER BY created_at LIMIT 1
+            )
+            RETURNING *
+        """, (worker, now, now, json.dumps(kinds), now - stale_after)).fetchone()
+    return _job_row(row) if row else None
+
+
+def update_job_progress(job_id: str, progress: dict):
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ?",
+            (json.dumps(progress), time.time(), job_id),
+        )
+
+
+def finish_job(job_id: str, status: str, progress: dict, result: dict = None, error: str = None):
+    now = time.time()
+    with get_db() as conn:
+        conn.execute("""
+            UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?,
+                            heartbeat_at = ?, finished_at = ?
+            WHERE id = ?
+        """, (status, json.dumps(progress), json.dumps(result) if result is not None else None,
+              error, now, now, job_id))
+
+
+def get_jobs(limit: int = 10, active_only: bool = False) -> list[dict]:
+    where = "WHERE status IN ('queued', 'running')" if active_only else ""
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(
+            f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [_job_row(r) for r in rows]
+
+
+def get_job(job_id: str) -> dict | None:
+    with get_db(readonly=True) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _job_row(row) if row else None
+
+
+def has_feeding_job(kind: str, job_id: str, stale_after: float) -> bool:
+    """Whether a `kind` job that job `job_id` should wait for is still active:
+    one running on a live worker, or one queued before `job_id` was.
+
+    Jobs queued later don't count; with FIFO claiming they may only run once
+    `job_id` itself finishes.
+    """
+    with get_db(readonly=True) as conn:
+        return conn.execute("""
+            SELECT 1 FROM jobs
+            WHERE kind = ? AND (
+                (status = 'running' AND heartbeat_at >= ?)
+                OR (status = 'queued' AND created_at < (SELECT created_at FROM jobs WHERE id = ?))
+            )
+            LIMIT 1
+        """, (kind, time.time() - stale_after, job_id)).fetchone() is not None
+
+
+def start_scrape_run(subreddits: list[str], source: str) -> str:
+    run_id = str(uuid.uuid4())
+    with get_db() as conn:
+        conn.execute(
+            "INSERT INTO scrape_runs (id, started_at, subreddits, source) VALUES (?, CURRENT_TIMESTAMP, ?, ?)",
+            (run_id, ",".join(subreddits), source),
+        )
+    return run_id
+
+
+def finish_scrape_run(run_id: str, stats: dict, status: str = "completed"):
+    with get_db() as conn:
+        conn.execute("""
+            UPDATE scrape_runs
+            SET finished_at = CURRENT_TIMESTAMP, status = ?, posts_found = ?,
+                posts_matched = ?, errors = ?, stats = ?
+            WHERE id = ?
+        """, (status, stats.get("found", 0), stats.get("matched", 0), stats.get("errors", 0),
+              json.dumps(stats), run_id))
+
+
+def get_scrape_runs(limit: int = 10) -> list[dict]:
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(
+            "SELECT * FROM scrape_runs ORDER BY started_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+    runs = [dict(r) for r in rows]
+    for run in runs:
+        run["stats"] = json.loads(run["stats"]) if run["stats"] else None
+    return runs
+
+
+def get_scrape_checkpoints(subreddit: str) -> dict:
+    """Return {feed: checkpoint row} for one subreddit."""
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(
+            "SELECT * FROM scrape_checkpoints WHERE subreddit = ?", (subreddit,)
+        ).fetchall()
+    return {r["feed"]: dict(r) for r in rows}
+
+
+def save_scrape_checkpoints(run_id: str, marks: list[tuple[str, str, str, float]]):
+    """Upsert (subreddit, feed, fullname, created_utc) marks; they never move backwards."""
+    if not marks:
+        return
+    with get_db() as conn:
+        conn.executemany("""
+            INSERT INTO scrape_checkpoints (subreddit, feed, last_fullname, last_created_utc, run_id)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (subreddit, feed) DO UPDATE SET
+                last_fullname = excluded.last_fullname,
+                last_created_utc = excluded.last_created_utc,
+                run_id = excluded.run_id,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE excluded.last_created_utc >= scrape_checkpoints.last_created_utc
+        """, [(sub, feed, fullname, created, run_id) for sub, feed, fullname, created in marks])
+
+
+def _analysis_params(analysis_id: str, post_id: str, analysis: dict) -> tuple:
+    return (
+        analysis_id,
+        post_id,
+        analysis.get("pain_point_summary", ""),
+        analysis.get("category", "Other"),
+        analysis.get("severity", 3),
+        analysis.get("affected_audience", ""),
+        json.dumps(analysis.get("potential_solutions", [])),
+        analysis.get("market_size_estimate", ""),
+        json.dumps(analysis.get("existing_solutions", [])),
+        analysis.get("opportunity_score", 50),
+    )
+
+
+INSERT_ANALYSIS_SQL = """
+    INSERT INTO analyses (id, post_id, pain_point_summary, category, severity,
+                          affected_audience, potential_solutions, market_size_estimate,
+                          existing_solutions, opportunity_score)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+INSERT_RAW_SQL = "INSERT INTO analysis_raw (analysis_id, raw_llm_response) VALUES (?, ?)"
+
+
+def _raw_rows(rows: list[tuple[str, dict]]) -> list[tuple]:
+    """analysis_raw rows for (analysis_id, analysis) pairs; empty responses aren't stored."""
+    return [(analysis_id, _pack(analysis["raw_llm_response"]))
+            for analysis_id, analysis in rows if analysis.get("raw_llm_response")]
 
 
 def insert_analysis(post_id: str, analysis: dict) -> str:
     analysis_id = str(uuid.uuid4())
     with get_db() as conn:
-        conn.execute("""
-            INSERT INTO analyses (id, post_id, pain_point_summary, category, severity,
-                                  affected_audience, potential_solutions, market_size_estimate,
-                                  existing_solutions, opportunity_score, raw_llm_response)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            analysis_id,
-            post_id,
-            analysis.get("pain_point_summary", ""),
-            analysis.get("category", "Other"),
-            analysis.get("severity", 3),
-            analysis.get("affected_audience", ""),
-            json.dumps(analysis.get("potential_solutions", [])),
-            analysis.get("market_size_estimate", ""),
-            json.dumps(analysis.get("existing_solutions", [])),
-            analysis.get("opportunity_score", 50),
-            analysis.get("raw_llm_response", ""),
-        ))
-        conn.execute("UPDATE posts SET is_analyzed = 1 WHERE id = ?", (post_id,))
+        conn.execute(INSERT_ANALYSIS_SQL, _analysis_params(analysis_id, post_id, analysis))
+        conn.executemany(INSERT_RAW_SQL, _raw_rows([(analysis_id, analysis)]))
+        conn.execute("UPDATE posts SET is_analyzed = 1, lease_owner = NULL, lease_expires = NULL WHERE id = ?",
+                     (post_id,))
+        _bump_data_version(conn)
     return analysis_id
 
 
+def insert_analyses_bulk(results: list[tuple[str, dict]]) -> list[str]:
+    """Store (post_id, analysis) pairs in a single transaction."""
+    rows = [_analysis_params(str(uuid.uuid4()), post_id, analysis) for post_id, analysis in results]
+    with get_db() as conn:
+        conn.executemany(INSERT_ANALYSIS_SQL, rows)
+        conn.executemany(INSERT_RAW_SQL, _raw_rows([(r[0], analysis) for r, (_, analysis) in zip(rows, results)]))
+        conn.executemany("UPDATE posts SET is_analyzed = 1, lease_owner = NULL, lease_expires = NULL WHERE id = ?",
+                         [(post_id,) for post_id, _ in results])
+        _bump_data_version(conn)
+    return [r[0] for r in rows]
+
+
+def get_cached_analyses(content_hashes: list[str]) -> dict:
+    """Return {content_hash: analysis} for the hashes present in the cache."""
+    if not content_hashes:
+        return {}
+    placeholders = ",".join("?" * len(content_hashes))
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(
+            f"SELECT content_hash, analysis FROM analysis_cache WHERE content_hash IN ({placeholders})",
+            content_hashes,
+        ).fetchall()
+    return {r["content_hash"]: json.loads(r["analysis"]) for r in rows}
+
+
+def find_cache_candidates(buckets: list[tuple[int, str]]) -> list[dict]:
+    """Return cache entries sharing at least one MinHash band bucket."""
+    if not buckets:
+        return []
+    clauses = " OR ".join("(b.band = ? AND b.bucket = ?)" for _ in buckets)
+    params = [v for pair in buckets for v in pair]
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(f"""
+            SELECT DISTINCT c.content_hash, c.analysis, c.minhash
+            FROM analysis_cache_bands b
+            JOIN analysis_cache c ON c.content_hash = b.content_hash
+            WHERE {clauses}
+        """, params).fetchall()
+    return [dict(r) for r in rows]
+
+
+def touch_cache_entries(content_hashes: list[str]):
+    with get_db() as conn:
+        conn.executemany(
+            "UPDATE analysis_cache SET hits = hits + 1, last_used_at = ? WHERE content_hash = ?",
+            [(time.time(), h) for h in content_hashes],
+        )
+
+
+def store_cached_analyses(entries: list[dict], max_entries: int):
+    """Insert cache entries ({content_hash, analysis, minhash, buckets}) and evict LRU overflow."""
+    now = time.time()
+    with get_db() as conn:
+        conn.executemany("""
+            INSERT INTO analysis_cache (content_hash, analysis, minhash, last_used_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(content_hash) DO UPDATE SET
+                analysis = excluded.analysis, minhash = excluded.minhash,
+                last_used_at = excluded.last_used_at
+        """, [(e["content_hash"], json.dumps(e["analysis"]), e["minhash"], now) for e in entries])
+        conn.executemany(
+            "INSERT OR IGNORE INTO analysis_cache_bands (band, bucket, content_hash) VALUES (?, ?, ?)",
+            [(band, bucket, e["content_hash"]) for e in entries for band, bucket in e["buckets"]],
+        )
+        overflow = conn.execute("SELECT COUNT(*) AS cnt FROM analysis_cache").fetchone()["cnt"] - max_entries
+        if overflow > 0:
+            conn.execute("""
+                DELETE FROM analysis_cache WHERE content_hash IN (
+                    SELECT content_hash FROM analysis_cache ORDER BY last_used_at LIMIT ?
+                )
+            """, (overflow,))
+
+
+def _fts_query(search: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", search))
+
+
+# sort_by -> (column, tie-breaker). The tie-breaker lives on the same table
+# as the sort column so one composite index serves both ORDER BY and cursor.
+SORT_COLUMNS = {
+    "opportunity_score": ("a.opportunity_score", "a.post_id"),
+    "score": ("p.score", "p.id"),
+    "created_utc": ("p.created_utc", "p.id"),
+    "severity": ("a.severity", "a.post_id"),
+    "num_comments": ("p.num_comments", "p.id"),
+}
+
+
+# Analysis list fields, stored as JSON text -> their kind in analysis_solutions
+SOLUTION_FIELDS = {"potential_solutions": "potential", "existing_solutions": "existing"}
+
+# A pain point's stored fields: (key, SQL expression)
+PAIN_POINT_FIELDS = (
+    ("id", "p.id"), ("reddit_id", "p.reddit_id"), ("subreddit", "p.subreddit"), ("title", "p.title"),
+    ("body", POST_BODY), ("author", "p.author"), ("url", "p.url"), ("score", "p.score"),
+    ("num_comments", "p.num_comments"), ("created_utc", "p.created_utc"), ("post_type", "p.post_type"),
+    ("parent_id", "p.parent_id"), ("scraped_at", "p.scraped_at"), ("is_analyzed", "p.is_analyzed"),
+    ("matched_keywords", "p.matched_keywords"), ("pain_point_summary", "a.pain_point_summary"),
+    ("category", "a.category"), ("severity", "a.severity"), ("affected_audience", "a.affected_audience"),
+    ("potential_solutions", "a.potential_solutions"), ("market_size_estimate", "a.market_size_estimate"),
+    ("existing_solutions", "a.existing_solutions"), ("opportunity_score", "a.opportunity_score"),
+    ("analyzed_at", "a.analyzed_at"),
+)
+# Fields that are only selected by a view or on request
+EXTRA_FIELDS = (
+    # The start of the body, stored with the post so lists never touch post_bodies
+    ("body_snippet", f"substr(p.body_preview, 1, {BODY_SNIPPET_CHARS})"),
+    ("raw_llm_response",
+     "IFNULL((SELECT unpack_text(raw_llm_response) FROM analysis_raw WHERE analysis_id = a.id), '')"),
+)
+ALL_FIELDS = PAIN_POINT_FIELDS + EXTRA_FIELDS
+
+
+def _view(*keys: str) -> tuple:
+    return tuple((key, expr) for key, expr in ALL_FIELDS if key in keys)
+
+
+# Named projections; each endpoint defaults to the one it serves
+VIEWS = {
+    # What the dashboard's cards and trending list render
+    "card": _view("id", "subreddit", "title", "body_snippet", "url", "score", "num_comments", "created_utc",
+                  "pain_point_summary", "category", "severity", "potential_solutions", "existing_solutions",
+                  "opportunity_score"),
+    "detail": PAIN_POINT_FIELDS + _view("raw_llm_response"),
+    "export": PAIN_POINT_FIELDS,
+}
+
+
+def project_fields(names: Iterable[str] = None, view: str = "export") -> tuple:
+    """The (key, SQL) pairs to select: those of `view`, or if `names` are
+    given, just those fields (any of ALL_FIELDS, id always included).
+    Unknown views and names raise ValueError."""
+    if not names:
+        if view not in VIEWS:
+            raise ValueError(f"Unknown view: {view!r} (expected one of {', '.join(VIEWS)})")
+        return VIEWS[view]
+    names = set(names)
+    unknown = names - {key for key, _ in ALL_FIELDS}
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple((key, expr) for key, expr in ALL_FIELDS if key in names or key == "id")
+
+
+@lru_cache(maxsize=256)
+def _select_fields(fields: tuple, as_json: bool) -> str:
+    """Columns for `fields`, or with as_json one `item` column holding each row
+    as a JSON object built by SQLite.
+
+    In JSON, the solution lists are embedded as the arrays they are stored as
+    (an unparseable one becomes []), so rows reach the client without being
+    decoded and re-encoded in Python. Built once per projection.
+    """
+    if not as_json:
+        return ", ".join(f"{expr} AS {key}" for key, expr in fields)
+    values = [f"'{key}', " + (f"IIF(json_valid({expr}), json({expr}), json_array())"
+                              if key in SOLUTION_FIELDS else expr)
+              for key, expr in fields]
+    return f"json_object({', '.join(values)}) AS item"
+
+
+def encode_cursor(payload: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a cursor from encode_cursor(); raises ValueError if it is malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(payload, dict):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return payload
+
+
+def _seek_clauses(sort_col: str, tie_col: str, desc: bool, value, last_id: str) -> list[tuple[str, list]]:
+    """(clause, params) pairs selecting, in order, the rows after (value, last_id).
+
+    SQLite sorts NULL below every value, so rows with a NULL sort value come
+    last in descending order and first in ascending order. A row-value
+    comparison never matches NULL, so those rows get a clause of their own;
+    each clause stays a range on the (sort column, id) index.
+    """
+    comparison = "<" if desc else ">"
+    if value is None:
+        clauses = [(f" AND {sort_col} IS NULL AND {tie_col} {comparison} ?", [last_id])]
+        if not desc:
+            clauses.append((f" AND {sort_col} IS NOT NULL", []))
+    else:
+        clauses = [(f" AND ({sort_col}, {tie_col}) {comparison} (?, ?)", [value, last_id])]
+        if desc:
+            clauses.append((f" AND {sort_col} IS NULL", []))
+    return clauses
+
+
+def _pain_point_query(subreddit, category, min_score, search, sort_by, order, keyword=None,
+                      existing_solution=None, as_json=False, fields=None, view="export"):
+    """Build the SELECT pieces shared by get_pain_points() and iter_pain_points().
+
+    Returns (columns, from_clause, params, order_clause, sort_by, relevance).
+    With as_json the columns are the row's JSON `item`, plus `id` and the
+    sort column that pagination cursors need.
+    """
+    fts_query = _fts_query(search) if search else ""
+    fields = project_fields(fields, view)
+    if fts_query:
+        fields += (("snippet", "snippet(pain_points_fts, -1, '<mark>', '</mark>', '…', 16)"),)
+        from_clause = """
+            FROM pain_points_fts f
+            JOIN posts p ON p.id = f.post_id
+            JOIN analyses a ON a.post_id = p.id
+            WHERE pain_points_fts MATCH ?
+        """
+        params = [fts_query]
+    else:
+        from_clause = """
+            FROM posts p
+            JOIN analyses a ON a.post_id = p.id
+            WHERE 1=1
+        """
+        params = []
+        if search:
+            # A search without a single word can't match anything
+            from_clause += " AND 0"
+
+    if subreddit:
+        from_clause += " AND p.subreddit = ?"
+        params.append(subreddit)
+    if category:
+        from_clause += " AND a.category = ?"
+        params.append(category)
+    if min_score is not None:
+        from_clause += " AND a.opportunity_score >= ?"
+        params.append(min_score)
+    if keyword:
+        from_clause += " AND EXISTS (SELECT 1 FROM json_each(p.matched_keywords) WHERE value = ?)"
+        params.append(keyword.lower())
+    if existing_solution:
+        # Case-insensitive exact match, looked up in idx_analysis_solutions_name
+        from_clause += """ AND a.id IN (SELECT analysis_id FROM analysis_solutions
+                                        WHERE kind = 'existing' AND name = ?)"""
+        params.append(existing_solution.strip())
+
+    order_dir = "DESC" if order.lower() == "desc" else "ASC"
+    relevance = bool(sort_by == "relevance" and fts_query)
+    if relevance:
+        # Rank by bm25 with title and summary weighted above body. Ordering on
+        # FTS5's own rank column lets it sort internally and stop at LIMIT.
+        from_clause = from_clause.replace(
+            "WHERE pain_points_fts MATCH ?",
+            "WHERE pain_points_fts MATCH ? AND rank MATCH 'bm25(0, 5.0, 1.0, 3.0)'",
+        )
+        order_clause = "ORDER BY rank"
+    else:
+        if sort_by not in SORT_COLUMNS:
+            sort_by = "opportunity_score"
+        sort_col, tie_col = SORT_COLUMNS[sort_by]
+        order_clause = f"ORDER BY {sort_col} {order_dir}, {tie_col} {order_dir}"
+
+    columns = _select_fields(fields, as_json)
+    if as_json:
+        columns += ", p.id AS id" + ("" if relevance else f", {SORT_COLUMNS[sort_by][0]} AS {sort_by}")
+    return columns, from_clause, params, order_clause, sort_by, relevance
+
+
 def get_pain_points(
     subreddit: str = None,
     category: str = None,
@@ -143,123 +1441,441 @@ def get_pain_points(
     limit: int = 50,
     offset: int = 0,
     search: str = None,
+    cursor: str = None,
+    include_total: bool = True,
+    keyword: str = None,
+    existing_solution: str = None,
+    as_json: bool = False,
+    fields: list[str] = None,
+    view: str = "export",
 ):
-    query = """
-        SELECT p.*, a.pain_point_summary, a.category, a.severity,
-               a.affected_audience, a.potential_solutions, a.market_size_estimate,
-               a.existing_solutions, a.opportunity_score, a.analyzed_at
-        FROM posts p
-        JOIN analyses a ON a.post_id = p.id
-        WHERE 1=1
+    """Return (items, total, next_cursor) for one page of pain points.
+
+    Pass next_cursor back as `cursor` to fetch the following page with a
+    keyset seek on (sort column, id) instead of OFFSET. total is None unless
+    include_total is set, since counting re-runs the whole filter. With
+    as_json, items are JSON object strings rather than dicts. Items carry
+    the fields of `view`, or only `fields` if given (see project_fields).
     """
-    params = []
+    columns, from_clause, params, order_clause, sort_by, relevance = _pain_point_query(
+        subreddit, category, min_score, search, sort_by, order, keyword, existing_solution, as_json, fields, view,
+    )
 
-    if subreddit:
-        query += " AND p.subreddit = ?"
-        params.append(subreddit)
-    if category:
-        query += " AND a.category = ?"
-        params.append(category)
-    if min_score is not None:
-        query += " AND a.opportunity_score >= ?"
-        params.append(min_score)
-    if search:
-        query += " AND (p.title LIKE ? OR p.body LIKE ? OR a.pain_point_summary LIKE ?)"
-        params.extend([f"%{search}%"] * 3)
-
-    valid_sorts = {
-        "opportunity_score": "a.opportunity_score",
-        "score": "p.score",
-        "created_utc": "p.created_utc",
-        "severity": "a.severity",
-        "num_comments": "p.num_comments",
-    }
-    sort_col = valid_sorts.get(sort_by, "a.opportunity_score")
-    order_dir = "DESC" if order.lower() == "desc" else "ASC"
-    query += f" ORDER BY {sort_col} {order_dir} LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
+    after = decode_cursor(cursor) if cursor else None
+    seeks = [("", [])]
+    if after and relevance:
+        # bm25 scores can't be seeked on, so relevance cursors carry an offset.
+        offset = after.get("offset", 0)
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+    elif after:
+        value = after.get("value")
+        if ("value" not in after or not isinstance(after.get("id"), str)
+                or not (value is None or isinstance(value, (str, int, float)) and not isinstance(value, bool))):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        seeks = _seek_clauses(*SORT_COLUMNS[sort_by], order.lower() == "desc", value, after["id"])
+        offset = 0
 
-    with get_db() as conn:
-        rows = conn.execute(query, params).fetchall()
-        # Get total count
-        count_query = query.split("ORDER BY")[0].replace("SELECT p.*, a.*", "SELECT COUNT(*)")
-        count_query = "SELECT COUNT(*) as cnt FROM posts p JOIN analyses a ON a.post_id = p.id WHERE 1=1"
-        count_params = []
-        if subreddit:
-            count_query += " AND p.subreddit = ?"
-            count_params.append(subreddit)
-        if category:
-            count_query += " AND a.category = ?"
-            count_params.append(category)
-        if min_score is not None:
-            count_query += " AND a.opportunity_score >= ?"
-            count_params.append(min_score)
-        if search:
-            count_query += " AND (p.title LIKE ? OR p.body LIKE ? OR a.pain_point_summary LIKE ?)"
-            count_params.extend([f"%{search}%"] * 3)
-        total = conn.execute(count_query, count_params).fetchone()["cnt"]
+    with get_db(readonly=True) as conn:
+        rows = []
+        for page_clause, page_params in seeks:
+            rows += conn.execute(
+                f"SELECT {columns} {from_clause} {page_clause} {order_clause} LIMIT ? OFFSET ?",
+                params + page_params + [limit - len(rows), offset],
+            ).fetchall()
+            if len(rows) == limit:
+                break
+        total = None
+        if include_total:
+            total = conn.execute(f"SELECT COUNT(*) as cnt {from_clause}", params).fetchone()["cnt"]
 
-    return [dict(r) for r in rows], total
+    next_cursor = None
+    if len(rows) == limit:
+        if relevance:
+            next_cursor = encode_cursor({"offset": offset + limit})
+        else:
+            last = rows[-1]
+            next_cursor = encode_cursor({"value": last[sort_by], "id": last["id"]})
+    items = [r["item"] for r in rows] if as_json else [dict(r) for r in rows]
+    return items, total, next_cursor
 
 
-def get_pain_point_by_id(post_id: str):
-    with get_db() as conn:
-        row = conn.execute("""
-            SELECT p.*, a.pain_point_summary, a.category, a.severity,
-                   a.affected_audience, a.potential_solutions, a.market_size_estimate,
-                   a.existing_solutions, a.opportunity_score, a.analyzed_at,
-                   a.raw_llm_response
+def iter_pain_points(
+    subreddit: str = None,
+    category: str = None,
+    min_score: int = None,
+    sort_by: str = "opportunity_score",
+    order: str = "desc",
+    search: str = None,
+    keyword: str = None,
+    existing_solution: str = None,
+    as_json: bool = False,
+    fields: list[str] = None,
+    view: str = "export",
+    batch_size: int = EXPORT_BATCH_SIZE,
+):
+    """Yield every matching pain point, fetching batch_size rows at a time.
+
+    Takes the same filters, as_json, fields and view as get_pain_points()
+    but has no page limit. The
+    connection stays checked out, one read snapshot, until the generator is
+    exhausted or closed. It may be resumed from different threads (Starlette
+    runs sync iterators in a threadpool), but never concurrently.
+    """
+    columns, from_clause, params, order_clause, _, _ = _pain_point_query(
+        subreddit, category, min_score, search, sort_by, order, keyword, existing_solution, as_json, fields, view,
+    )
+    with get_db(readonly=True) as conn:
+        cur = conn.execute(f"SELECT {columns} {from_clause} {order_clause}", params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row["item"] if as_json else dict(row)
+
+
+def get_pain_point_by_id(post_id: str, as_json: bool = False, fields: list[str] = None, view: str = "detail"):
+    fields = project_fields(fields, view)
+    with get_db(readonly=True) as conn:
+        row = conn.execute(f"""
+            SELECT {_select_fields(fields, as_json)}
             FROM posts p
             JOIN analyses a ON a.post_id = p.id
             WHERE p.id = ?
         """, (post_id,)).fetchone()
-    return dict(row) if row else None
+    if not row:
+        return None
+    return row["item"] if as_json else dict(row)
 
 
-def get_stats():
-    with get_db() as conn:
-        total_posts = conn.execute("SELECT COUNT(*) as cnt FROM posts").fetchone()["cnt"]
-        analyzed = conn.execute("SELECT COUNT(*) as cnt FROM posts WHERE is_analyzed = 1").fetchone()["cnt"]
-        categories = conn.execute("""
-            SELECT category, COUNT(*) as cnt
-            FROM analyses GROUP BY category ORDER BY cnt DESC
+def _summary_avg(row) -> float:
+    return round(row["score_sum"] / row["score_count"], 1) if row["score_count"] else 0
+
+
+def get_category_stats():
+    """Per-category analysis counts and scores, read from stats_summary."""
+    with get_db(readonly=True) as conn:
+        rows = conn.execute("""
+            SELECT NULLIF(key, '') AS category, analyses AS cnt, score_sum, score_count, score_max
+            FROM stats_summary WHERE dimension = 'category' AND analyses > 0
+            ORDER BY cnt DESC
         """).fetchall()
-        subreddits = conn.execute("""
-            SELECT subreddit, COUNT(*) as cnt
-            FROM posts WHERE is_analyzed = 1 GROUP BY subreddit ORDER BY cnt DESC
+    return [{"category": r["category"], "cnt": r["cnt"], "avg_opportunity_score": _summary_avg(r),
+             "top_opportunity_score": r["score_max"] or 0} for r in rows]
+
+
+def get_subreddit_stats():
+    """Per-subreddit analyzed-post counts and scores, read from stats_summary."""
+    with get_db(readonly=True) as conn:
+        rows = conn.execute("""
+            SELECT NULLIF(key, '') AS subreddit, analyzed_posts AS cnt, score_sum, score_count, score_max
+            FROM stats_summary WHERE dimension = 'subreddit' AND analyzed_posts > 0
+            ORDER BY cnt DESC
         """).fetchall()
-        avg_score = conn.execute("SELECT AVG(opportunity_score) as avg FROM analyses").fetchone()["avg"]
-        top_score = conn.execute("SELECT MAX(opportunity_score) as mx FROM analyses").fetchone()["mx"]
+    return [{"subreddit": r["subreddit"], "cnt": r["cnt"], "avg_opportunity_score": _summary_avg(r),
+             "top_opportunity_score": r["score_max"] or 0} for r in rows]
+
+
+def get_stats():
+    with get_db(readonly=True) as conn:
+        totals = conn.execute(
+            "SELECT * FROM stats_summary WHERE dimension = 'total' AND key = ''"
+        ).fetchone()
 
     return {
-        "total_posts": total_posts,
-        "analyzed_posts": analyzed,
-        "categories": [dict(c) for c in categories],
-        "subreddits": [dict(s) for s in subreddits],
-        "avg_opportunity_score": round(avg_score, 1) if avg_score else 0,
-        "top_opportunity_score": top_score or 0,
+        "total_posts": totals["posts"] if totals else 0,
+        "analyzed_posts": totals["analyzed_posts"] if totals else 0,
+        "categories": get_category_stats(),
+        "subreddits": get_subreddit_stats(),
+        "avg_opportunity_score": _summary_avg(totals) if totals else 0,
+        "top_opportunity_score": (totals["score_max"] if totals else None) or 0,
     }
 
 
-def get_unanalyzed_posts(limit: int = 20):
+# Unanalyzed posts still due for analysis: with RELEVANCE_FILTER, those not
+# yet scored by the relevance classifier or scored at or above its threshold
+PENDING_ANALYSIS = "is_analyzed = 0" + (
+    " AND (relevance IS NULL OR relevance >= IFNULL((SELECT threshold FROM relevance_model), 0))"
+    if RELEVANCE_FILTER else ""
+)
+
+# What analysis needs from a post (bodies are only read for rows handed out)
+ANALYSIS_COLUMNS = ("id, subreddit, title, post_type, score, num_comments, created_utc, matched_keywords, "
+                    "relevance, priority, (SELECT unpack_text(body) FROM post_bodies WHERE post_id = posts.id) AS body")
+
+
+def claim_posts(owner: str, limit: int, lease_seconds: float) -> list[dict]:
+    """Lease the `limit` highest-priority posts due for analysis to `owner`.
+
+    Posts leased to another analyzer are skipped until the lease expires, so
+    concurrent analyzers get disjoint batches. A lease ends when the post's
+    analysis is stored; a post whose analysis failed is retried by whoever
+    claims it after the lease runs out.
+    """
+    now = time.time()
     with get_db() as conn:
-        rows = conn.execute(
-            "SELECT * FROM posts WHERE is_analyzed = 0 ORDER BY score DESC LIMIT ?",
-            (limit,)
-        ).fetchall()
-    return [dict(r) for r in rows]
+        # One statement, so the read and the lease happen under the write lock
+        rows = conn.execute(f"""
+            UPDATE posts SET lease_owner = ?, lease_expires = ?
+            WHERE rowid IN (
+                SELECT rowid FROM posts INDEXED BY idx_posts_backlog
+                WHERE {PENDING_ANALYSIS} AND (lease_expires IS NULL OR lease_expires < ?)
+                ORDER BY priority DESC LIMIT ?
+            )
+            RETURNING {ANALYSIS_COLUMNS}
+        """, (owner, now + lease_seconds, now, limit)).fetchall()
+    return sorted((dict(r) for r in rows), key=lambda post: post["priority"] or 0, reverse=True)
 
 
-def get_trending(limit: int = 10):
-    """Get pain points trending by recency + engagement."""
+def lease_posts(owner: str, post_ids: list[str], lease_seconds: float) -> set[str]:
+    """Lease specific posts to `owner`; returns the ids that weren't already leased."""
+    now = time.time()
     with get_db() as conn:
         rows = conn.execute("""
-            SELECT p.*, a.pain_point_summary, a.category, a.severity,
-                   a.affected_audience, a.potential_solutions, a.market_size_estimate,
-                   a.existing_solutions, a.opportunity_score, a.analyzed_at
-            FROM posts p
-            JOIN analyses a ON a.post_id = p.id
-            ORDER BY (p.score * 2 + p.num_comments * 3 + a.opportunity_score) DESC
+            UPDATE posts SET lease_owner = ?, lease_expires = ?
+            WHERE id IN (SELECT value FROM json_each(?)) AND is_analyzed = 0
+              AND (lease_expires IS NULL OR lease_expires < ?)
+            RETURNING id
+        """, (owner, now + lease_seconds, json.dumps(post_ids), now)).fetchall()
+    return {r["id"] for r in rows}
+
+
+def count_unanalyzed_posts() -> int:
+    with get_db(readonly=True) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM posts INDEXED BY idx_posts_backlog WHERE {PENDING_ANALYSIS}"
+                            ).fetchone()[0]
+
+
+def get_unscored_posts(limit: int = 1000) -> list[dict]:
+    """Unanalyzed posts the relevance classifier hasn't scored yet."""
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(f"""
+            SELECT id, subreddit, title, {POST_BODY} AS body, post_type, matched_keywords FROM posts p
+            WHERE rowid IN (SELECT rowid FROM posts INDEXED BY idx_posts_backlog
+                            WHERE is_analyzed = 0 AND relevance IS NULL LIMIT ?)
+        """, (limit,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_labeled_posts() -> list[dict]:
+    """Analyzed posts with their (best) opportunity_score, for training."""
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(f"""
+            SELECT p.id, p.subreddit, p.title, {POST_BODY} AS body, p.post_type, p.matched_keywords,
+                   MAX(a.opportunity_score) AS opportunity_score
+            FROM posts p JOIN analyses a ON a.post_id = p.id
+            GROUP BY p.id
+        """).fetchall()
+    return [dict(r) for r in rows]
+
+
+def save_relevance_model(weights: bytes, bias: float, threshold: float, metrics: dict):
+    """Store the classifier and clear scores from the previous one, so pending
+    posts are rescored by the new model."""
+    with get_db() as conn:
+        conn.execute("""
+            INSERT INTO relevance_model (id, weights, bias, threshold, metrics, trained_at)
+            VALUES (1, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                weights = excluded.weights, bias = excluded.bias, threshold = excluded.threshold,
+                metrics = excluded.metrics, trained_at = excluded.trained_at
+        """, (weights, bias, threshold, json.dumps(metrics), time.time()))
+        conn.execute("UPDATE posts SET relevance = NULL WHERE is_analyzed = 0 AND relevance IS NOT NULL")
+
+
+def load_relevance_model() -> dict | None:
+    with get_db(readonly=True) as conn:
+        row = conn.execute("SELECT * FROM relevance_model WHERE id = 1").fetchone()
+    if not row:
+        return None
+    model = dict(row)
+    model["metrics"] = json.loads(model["metrics"]) if model["metrics"] else {}
+    return model
+
+
+def set_post_relevance(scores: list[tuple[str, float]]):
+    """Store (post_id, relevance) pairs."""
+    with get_db() as conn:
+        conn.executemany("UPDATE posts SET relevance = ? WHERE id = ?",
+                         [(relevance, post_id) for post_id, relevance in scores])
+
+
+def count_skipped_irrelevant() -> int:
+    """Unanalyzed posts the relevance classifier held back from the LLM."""
+    with get_db(readonly=True) as conn:
+        return conn.execute("""
+            SELECT COUNT(*) FROM posts
+            WHERE is_analyzed = 0 AND relevance < (SELECT threshold FROM relevance_model)
+        """).fetchone()[0]
+
+
+def get_trending(limit: int = 10, as_json: bool = False, fields: list[str] = None, view: str = "export"):
+    """Get pain points trending by recency + engagement."""
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(f"""
+            SELECT {_select_fields(project_fields(fields, view), as_json)}
+            FROM analyses a
+            JOIN posts p ON p.id = a.post_id
+            ORDER BY a.trending_score DESC
             LIMIT ?
         """, (limit,)).fetchall()
+    return [r["item"] for r in rows] if as_json else [dict(r) for r in rows]
+
+
+def get_analysis_summaries() -> list[str]:
+    """Every stored pain_point_summary, for fitting the clustering vectors."""
+    with get_db(readonly=True) as conn:
+        return [r[0] or "" for r in conn.execute("SELECT pain_point_summary FROM analyses")]
+
+
+def count_analyses() -> int:
+    with get_db(readonly=True) as conn:
+        row = conn.execute("SELECT analyses FROM stats_summary WHERE dimension = 'total' AND key = ''").fetchone()
+    return row["analyses"] if row else 0
+
+
+def count_unclustered_analyses() -> int:
+    with get_db(readonly=True) as conn:
+        return conn.execute("SELECT COUNT(*) FROM analyses WHERE cluster_id IS NULL").fetchone()[0]
+
+
+def get_unclustered_analyses(limit: int = 1000) -> list[dict]:
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(
+            "SELECT id, pain_point_summary FROM analyses WHERE cluster_id IS NULL LIMIT ?", (limit,)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def load_cluster_model() -> dict | None:
+    with get_db(readonly=True) as conn:
+        row = conn.execute("SELECT * FROM cluster_model WHERE id = 1").fetchone()
+    return dict(row) if row else None
+
+
+def load_clusters() -> tuple[int, list[dict]]:
+    """(cluster_version, [{id, centroid}]) for every cluster."""
+    with get_db(readonly=True) as conn:
+        # Version first: a save landing between the two reads then shows up
+        # as a version mismatch rather than going unnoticed
+        version = conn.execute("SELECT value FROM meta WHERE key = 'cluster_version'").fetchone()[0]
+        rows = conn.execute("SELECT id, centroid FROM clusters").fetchall()
+    return version, [dict(r) for r in rows]
+
+
+def reset_clusters(df: bytes, documents: int):
+    """Drop every cluster and store new document frequencies."""
+    with get_db() as conn:
+        conn.execute("DELETE FROM clusters")
+        conn.execute("UPDATE analyses SET cluster_id = NULL WHERE cluster_id IS NOT NULL")
+        conn.execute("""
+            INSERT INTO cluster_model (id, df, documents, built_at) VALUES (1, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                df = excluded.df, documents = excluded.documents, built_at = excluded.built_at
+        """, (df, documents, time.time()))
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'cluster_version'")
+        _bump_data_version(conn)
+
+
+def save_clusters(version: int, clusters: list[tuple[int, bytes]], assignments: list[tuple[int, str]],
+                  refresh: bool = True) -> bool:
+    """Store (id, centroid) clusters and (cluster_id, analysis_id) assignments,
+    and unless `refresh` is False recompute those clusters' aggregates.
+
+    Nothing is written, and False returned, if clusters changed since
+    `version` was loaded.
+    """
+    with get_db() as conn:
+        if not conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'cluster_version' AND value = ?",
+                            (version,)).rowcount:
+            return False
+        conn.executemany("""
+            INSERT INTO clusters (id, centroid) VALUES (?, ?)
+            ON CONFLICT (id) DO UPDATE SET centroid = excluded.centroid
+        """, clusters)
+        conn.executemany("UPDATE analyses SET cluster_id = ? WHERE id = ?", assignments)
+        if refresh:
+            _refresh_clusters(conn, [cluster_id for cluster_id, _ in clusters])
+        _bump_data_version(conn)
+    return True
+
+
+def _refresh_clusters(conn: sqlite3.Connection, cluster_ids: list[int] = None):
+    """Recompute the member aggregates of `cluster_ids`, or of every cluster."""
+    if cluster_ids is None:
+        members, params = "a.cluster_id IS NOT NULL", []
+    else:
+        members, params = "a.cluster_id IN (SELECT value FROM json_each(?))", [json.dumps(cluster_ids)]
+    conn.execute(f"""
+        UPDATE clusters SET
+            size = s.size, label = s.label, representative_id = s.post_id, score_sum = s.score_sum,
+            comments_sum = s.comments_sum, opportunity_avg = s.opportunity_avg,
+            opportunity_max = s.opportunity_max, updated_at = ?,
+            category = (SELECT category FROM analyses WHERE cluster_id = clusters.id
+                        GROUP BY category ORDER BY COUNT(*) DESC LIMIT 1)
+        FROM (
+            -- With a single max() aggregate, SQLite takes the bare columns
+            -- (label, post_id) from the row holding the maximum
+            SELECT a.cluster_id, COUNT(*) AS size, SUM(p.score) AS score_sum,
+                   SUM(p.num_comments) AS comments_sum, AVG(a.opportunity_score) AS opportunity_avg,
+                   MAX(a.opportunity_score) AS opportunity_max, a.pain_point_summary AS label, a.post_id
+            FROM analyses a JOIN posts p ON p.id = a.post_id
+            WHERE {members}
+            GROUP BY a.cluster_id
+        ) s
+        WHERE clusters.id = s.cluster_id
+    """, [time.time()] + params)
+
+
+def refresh_cluster_stats():
+    """Recompute every cluster's aggregates, e.g. after post scores were re-scraped."""
+    with get_db() as conn:
+        _refresh_clusters(conn)
+        _bump_data_version(conn)
+
+
+# sort_by -> clusters ORDER BY expression
+CLUSTER_SORTS = {
+    "size": "size",
+    "opportunity": "opportunity_avg",
+    "engagement": "score_sum + comments_sum",
+}
+CLUSTER_COLUMNS = ("id, label, representative_id, category, size, score_sum, comments_sum, "
+                   "ROUND(opportunity_avg, 1) AS opportunity_avg, opportunity_max, updated_at")
+
+
+def get_clusters(limit: int = 20, min_size: int = 2, sort_by: str = "size", category: str = None) -> list[dict]:
+    """The largest (or highest-opportunity, or most engaged) clusters."""
+    where, params = "size >= ?", [min_size]
+    if category:
+        where += " AND category = ?"
+        params.append(category)
+    order = CLUSTER_SORTS.get(sort_by, CLUSTER_SORTS["size"])
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(
+            f"SELECT {CLUSTER_COLUMNS} FROM clusters WHERE {where} ORDER BY {order} DESC, id LIMIT ?",
+            params + [limit],
+        ).fetchall()
     return [dict(r) for r in rows]
+
+
+def get_cluster(cluster_id: int) -> dict | None:
+    with get_db(readonly=True) as conn:
+        row = conn.execute(f"SELECT {CLUSTER_COLUMNS} FROM clusters WHERE id = ?", (cluster_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def get_cluster_members(cluster_id: int, limit: int = 50, as_json: bool = False, fields: list[str] = None,
+                        view: str = "card"):
+    """A cluster's pain points, highest opportunity first."""
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(f"""
+            SELECT {_select_fields(project_fields(fields, view), as_json)}
+            FROM analyses a
+            JOIN posts p ON p.id = a.post_id
+            WHERE a.cluster_id = ?
+            ORDER BY a.opportunity_score DESC
+            LIMIT ?
+        """, (cluster_id, limit)).fetchall()
+    return [r["item"] for r in rows] if as_json else [dict(r) for r in rows]
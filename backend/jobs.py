@@ -0,0 +1,206 @@
+"""SQLite-backed job queue for scraping and analysis.
+
+The API and CLI only enqueue jobs; `cli.py worker` (or the API's embedded
+worker) claims and runs them. Job state and progress live in the jobs
+table, so they survive restarts and are visible to every process.
+
+A triggered run enqueues a scrape job and an analyze job together. The
+analyze job drains the unanalyzed backlog in chunks, and while a scrape
+job is still active it waits for more posts instead of finishing, so
+the two stages overlap.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from config import (
+    SCRAPE_LIMIT, ANALYSIS_CONCURRENCY, ANALYSIS_STRATEGY,
+    ANALYSIS_JOB_CHUNK, ANALYSIS_LEASE_SECONDS, JOB_POLL_SECONDS, JOB_STALE_SECONDS, JOB_WORKER_THREADS,
+)
+from database import (
+    enqueue_job, claim_job, update_job_progress, finish_job, has_feeding_job,
+    claim_posts, count_unanalyzed_posts,
+)
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 1.0  # Seconds between progress writes
+
+
+class Progress:
+    """Counters for a running job, written to the jobs table at most once per
+    PROGRESS_INTERVAL (each write also serves as the job's heartbeat)."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.counters: dict = {}
+        self.written_at = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, **counters):
+        with self._lock:
+            self.counters.update(counters)
+            if time.monotonic() - self.written_at >= PROGRESS_INTERVAL:
+                self._write()
+
+    def heartbeat(self):
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        self.written_at = time.monotonic()
+        update_job_progress(self.job_id, self.counters)
+
+
+def run_scrape_job(params: dict, progress: Progress) -> dict:
+    subreddits = params.get("subreddits")
+    limit = params.get("limit", SCRAPE_LIMIT)
+    full = params.get("full", False)
+
+    def on_progress(stats):
+        progress.update(**{k: v for k, v in stats.items() if isinstance(v, (int, float))})
+
+    if params.get("public") and params.get("async"):
+        from scraper_public import scrape_all_public_async
+        return scrape_all_public_async(subreddits, limit, full=full, on_progress=on_progress)
+    if params.get("public"):
+        from scraper_public import scrape_all_public
+        return scrape_all_public(subreddits, limit, full=full, on_progress=on_progress)
+    from scraper import run_scrape
+    return run_scrape(subreddits, limit, full=full, on_progress=on_progress)
+
+
+def run_analyze_job(params: dict, progress: Progress) -> dict:
+    """Claim and analyze posts chunk by chunk until the backlog is drained.
+
+    Chunks are leased to this job, so other analyzers never get the same
+    posts. A post that fails stays leased until ANALYSIS_LEASE_SECONDS
+    passes, so it doesn't keep the job looping.
+    """
+    from analyzer import analyze_posts, score_backlog, cluster_analyses
+    chunk_size = params.get("chunk_size", ANALYSIS_JOB_CHUNK)
+    concurrency = params.get("concurrency", ANALYSIS_CONCURRENCY)
+    strategy = params.get("strategy", ANALYSIS_STRATEGY)
+    totals = {"analyzed": 0, "failed": 0, "requests": 0, "skipped_irrelevant": 0, "clustered": 0,
+              "chunks": 0}
+
+    while True:
+        totals["skipped_irrelevant"] += score_backlog()
+        posts = claim_posts(progress.job_id, chunk_size, ANALYSIS_LEASE_SECONDS)
+        if not posts:
+            # Keep going while a scrape job may still be adding posts
+            if has_feeding_job("scrape", progress.job_id, JOB_STALE_SECONDS):
+                progress.update(**totals, backlog=0, waiting=True)
+                time.sleep(JOB_POLL_SECONDS)
+                continue
+            break
+        stats = analyze_posts(posts, concurrency=concurrency, strategy=strategy)
+        for k in ("analyzed", "failed", "requests", "skipped_irrelevant"):
+            totals[k] += stats[k]
+        totals["clustered"] += cluster_analyses()
+        totals["chunks"] += 1
+        progress.update(**totals, backlog=count_unanalyzed_posts(), waiting=False)
+
+    logger.info(f"Analysis job drained the backlog: {totals['analyzed']} analyzed, "
+                f"{totals['failed']} failed in {totals['chunks']} chunks")
+    return totals
+
+
+JOB_HANDLERS = {
+    "scrape": run_scrape_job,
+    "analyze": run_analyze_job,
+}
+
+# Counters reported as per-minute throughput on the status endpoint
+THROUGHPUT_COUNTERS = {"scrape": "found", "analyze": "analyzed"}
+
+
+def enqueue_pipeline(scrape_params: dict = None, analyze_params: dict = None) -> dict:
+    """Queue a scrape and an analysis of its output, unless one is already active."""
+    queued = {
+        "scrape": enqueue_job("scrape", scrape_params, unless_active=True),
+        "analyze": enqueue_job("analyze", analyze_params, unless_active=True),
+    }
+    return {kind: job_id for kind, job_id in queued.items() if job_id}
+
+
+def describe_job(job: dict) -> dict:
+    """Add elapsed time and throughput (per minute) to a job row."""
+    if job["started_at"]:
+        end = job["finished_at"] or time.time()
+        elapsed = max(end - job["started_at"], 1e-6)
+        job["elapsed_seconds"] = round(elapsed, 1)
+        counter = THROUGHPUT_COUNTERS.get(job["kind"])
+        done = (job["progress"] or {}).get(counter, 0)
+        job["throughput_per_minute"] = round(done / elapsed * 60, 1)
+    return job
+
+
+def run_job(job: dict):
+    progress = Progress(job["id"])
+    done = threading.Event()
+
+    # Heartbeat even when a long step (one analysis chunk, one slow subreddit)
+    # reports no progress, so the job isn't mistaken for a dead worker's
+    def beat():
+        while not done.wait(JOB_STALE_SECONDS / 4):
+            progress.heartbeat()
+
+    threading.Thread(target=beat, daemon=True).start()
+    logger.info(f"Running {job['kind']} job {job['id']}")
+    try:
+        result = JOB_HANDLERS[job["kind"]](job["params"] or {}, progress)
+    except Exception as e:
+        logger.exception(f"{job['kind']} job {job['id']} failed")
+        finish_job(job["id"], "failed", progress.counters, error=str(e))
+        return
+    finally:
+        done.set()
+    finish_job(job["id"], "completed", progress.counters, result=result)
+
+
+class Worker:
+    """Claims and runs jobs on `threads` threads until stopped.
+
+    Two threads are enough for a scrape and an analysis to run side by
+    side. With once=True the worker exits when the queue is empty.
+    """
+
+    def __init__(self, kinds: list[str] = None, threads: int = JOB_WORKER_THREADS, once: bool = False):
+        self.kinds = kinds or list(JOB_HANDLERS)
+        self.threads = threads
+        self.once = once
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopped = threading.Event()
+
+    def _loop(self, index: int):
+        worker = f"{self.name}/{index}"
+        while not self.stopped.is_set():
+            job = claim_job(worker, self.kinds, JOB_STALE_SECONDS)
+            if job:
+                run_job(job)
+            elif self.once:
+                return
+            else:
+                self.stopped.wait(JOB_POLL_SECONDS)
+
+    def start(self) -> list[threading.Thread]:
+        threads = [threading.Thread(target=self._loop, args=(i,), daemon=True, name=f"job-worker-{i}")
+                   for i in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def run(self):
+        """Run in the foreground until every thread exits (or Ctrl-C)."""
+        threads = self.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,61 @@
+"""Pain-point keyword matching shared by both scrapers.
+
+Keywords are lowercased and deduplicated once, when the matcher is built;
+nothing is compiled. Each post is lowercased once and scanned with
+plain substring checks (CPython's memchr-backed search, which benchmarks
+faster here than a combined regex or an Aho-Corasick automaton for ~30
+keywords). Substring hits are then checked for word boundaries.
+"""
+from config import PAIN_KEYWORDS
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _contains_word(text: str, phrase: str) -> bool:
+    """True if `phrase` occurs in `text` with a word boundary on both sides."""
+    start = text.find(phrase)
+    while start != -1:
+        end = start + len(phrase)
+        if (start == 0 or not _is_word_char(text[start - 1])) and \
+                (end == len(text) or not _is_word_char(text[end])):
+            return True
+        start = text.find(phrase, start + 1)
+    return False
+
+
+class KeywordMatcher:
+    """Finds which of a fixed set of keyword phrases occur in a text.
+
+    Matching is case-insensitive and on word boundaries, so "broken" does
+    not fire on "unbroken" and "i wish" does not fire on "hawaii wish".
+    """
+
+    def __init__(self, keywords: list[str]):
+        self.keywords = tuple(dict.fromkeys(kw.lower() for kw in keywords))
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return text.lower().replace("’", "'")
+
+    def find(self, text: str) -> list[str]:
+        """Matched keywords, in the order they are listed in `keywords`."""
+        if not text:
+            return []
+        text = self._normalize(text)
+        return [kw for kw in self.keywords if kw in text and _contains_word(text, kw)]
+
+    def matches(self, text: str) -> bool:
+        if not text:
+            return False
+        text = self._normalize(text)
+        return any(kw in text and _contains_word(text, kw) for kw in self.keywords)
+
+
+pain_keywords = KeywordMatcher(PAIN_KEYWORDS)
+
+
+def find_pain_keywords(text: str) -> list[str]:
+    """Return the pain-point keywords that appear in `text`."""
+    return pain_keywords.find(text)
@@ -0,0 +1,98 @@
+"""Streaming scrape -> analyze pipeline (`cli.py run --stream`).
+
+The scraper runs on its own thread, and each batch of newly stored posts is
+handed to the analyzer over a bounded queue. Analysis starts with the
+first batch instead of waiting for the scrape to finish, and never
+re-reads the backlog from the database. When analysis falls behind, the
+full queue blocks the scraper's writes, which is the backpressure. Wall
+time is about max(scrape, analyze) rather than their sum.
+"""
+import logging
+import os
+import queue
+import socket
+import threading
+from config import ANALYSIS_CONCURRENCY, ANALYSIS_STRATEGY, ANALYSIS_LEASE_SECONDS, STREAM_QUEUE_SIZE
+from database import lease_posts
+from analyzer import analyze_stream, cluster_analyses
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+POLL_SECONDS = 0.5  # How often an idle consumer stores finished analyses
+MAX_CHUNK = 50  # Posts handed to the analyzer at once
+
+
+def run_pipeline(scrape, concurrency: int = ANALYSIS_CONCURRENCY,
+                 strategy: str = ANALYSIS_STRATEGY, queue_size: int = STREAM_QUEUE_SIZE) -> dict:
+    """Run `scrape(on_insert=...)` and analyze its posts as they are stored.
+
+    `scrape` is one of the scraper entry points with its arguments bound.
+    If analysis fails, the scraper stops feeding the queue but keeps
+    storing posts; they stay unanalyzed for a later `analyze`.
+    """
+    posts_queue = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+    outcome = {}
+
+    def put(item):
+        # Blocks while the queue is full, unless the consumer has gone away
+        while not stopped.is_set():
+            try:
+                posts_queue.put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    owner = f"stream:{socket.gethostname()}:{os.getpid()}"
+
+    def on_insert(posts):
+        # Lease new posts so a concurrent analyze job doesn't take them too
+        leased = lease_posts(owner, [post["id"] for post in posts], ANALYSIS_LEASE_SECONDS)
+        for post in posts:
+            if post["id"] in leased:
+                put(post)
+
+    def produce():
+        try:
+            outcome["scrape"] = scrape(on_insert=on_insert)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            put(_DONE)
+
+    def chunks():
+        while True:
+            try:
+                first = posts_queue.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                yield []
+                continue
+            if first is _DONE:
+                return
+            chunk = [first]
+            while len(chunk) < MAX_CHUNK:
+                try:
+                    post = posts_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if post is _DONE:
+                    yield chunk
+                    return
+                chunk.append(post)
+            yield chunk
+
+    producer = threading.Thread(target=produce, name="stream-scraper", daemon=True)
+    producer.start()
+    try:
+        analysis = analyze_stream(chunks(), concurrency=concurrency, strategy=strategy)
+    finally:
+        stopped.set()
+        producer.join()
+
+    if "error" in outcome:
+        raise outcome["error"]
+    analysis["clustered"] = cluster_analyses()
+    logger.info(f"Pipeline complete: {outcome['scrape']['matched']} matched, "
+                f"{analysis['analyzed']} analyzed, {analysis['failed']} failed")
+    return {"scrape": outcome["scrape"], "analysis": analysis}
@@ -0,0 +1,67 @@
+"""Token-bucket rate limiters shared by the scrapers and analyzer."""
+import asyncio
+import threading
+import time
+
+
+class AsyncTokenBucket:
+    """Asyncio token bucket: refills `rate` tokens per second, banks up to `capacity`.
+
+    One bucket is shared by every task that talks to the same API, so the
+    combined request rate stays within budget however many tasks run.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Hold off all callers for `seconds`, e.g. after a 429 with Retry-After."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class TokenBucket:
+    """Thread-safe token bucket for worker pools; same semantics as AsyncTokenBucket."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                time.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Hold off all callers for `seconds`, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
@@ -0,0 +1,229 @@
+"""Cheap local relevance classifier that runs before the LLM.
+
+Keyword matching lets through posts that use "broken" or "sucks" casually,
+and the LLM then scores them 10 or below at full price. This logistic
+regression is trained on the stored analyses and predicts whether a post
+is a real pain point before any LLM call is made.
+
+Features are hashed (the "hashing trick") into HASH_DIM buckets:
+- word unigrams and bigrams of the title and body
+- the matched pain keywords, subreddit and post type
+
+Each post's vector is log-scaled and L2-normalized. A batch is held as
+parallel (row, column, value) arrays, so scoring and every training
+step are a few numpy operations over the whole batch.
+"""
+import json
+import logging
+import re
+import zlib
+import numpy as np
+from config import RELEVANCE_LABEL_SCORE, RELEVANCE_TARGET_RECALL, RELEVANCE_MIN_POSTS
+from database import (
+    get_labeled_posts, save_relevance_model, load_relevance_model, set_post_relevance, get_unscored_posts,
+)
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 18
+HASH_DIM = 1 << HASH_BITS
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def _features(post: dict) -> list[int]:
+    text = f"{post.get('title') or ''} {post.get('body') or ''}".lower()
+    tokens = _TOKEN.findall(text)
+    keywords = post.get("matched_keywords") or []
+    if isinstance(keywords, str):
+        keywords = json.loads(keywords)
+    names = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    names += [f"kw:{kw}" for kw in keywords]
+    names += [f"sub:{post.get('subreddit')}", f"type:{post.get('post_type')}"]
+    # crc32 rather than hash(), which is salted per process
+    return [zlib.crc32(name.encode()) & (HASH_DIM - 1) for name in names]
+
+
+def vectorize(posts: list[dict]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sparse (rows, cols, values) feature matrix for a batch of posts."""
+    features = [_features(post) for post in posts]
+    rows = np.repeat(np.arange(len(posts), dtype=np.int64), [len(f) for f in features])
+    cols = np.fromiter((c for f in features for c in f), dtype=np.int64, count=len(rows))
+    keys, counts = np.unique(rows * HASH_DIM + cols, return_counts=True)
+    rows, cols = keys // HASH_DIM, keys % HASH_DIM
+    values = 1 + np.log(counts)
+    norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(posts)))
+    return rows, cols, values / np.maximum(norms[rows], 1e-12)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-np.clip(z, -30, 30)))
+
+
+class RelevanceModel:
+    """Hashed-feature logistic regression; score() is P(real pain point)."""
+
+    def __init__(self, weights: np.ndarray, bias: float, threshold: float = 0.5, metrics: dict = None):
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+        self.metrics = metrics or {}
+
+    def score(self, posts: list[dict]) -> np.ndarray:
+        if not posts:
+            return np.zeros(0)
+        rows, cols, values = vectorize(posts)
+        logits = np.bincount(rows, weights=self.weights[cols] * values, minlength=len(posts))
+        return _sigmoid(logits + self.bias)
+
+    def filter(self, posts: list[dict]) -> tuple[list[dict], list[dict]]:
+        """Score the posts that have no relevance yet, store it, and split
+        all of them into (kept, skipped)."""
+        unscored = [post for post in posts if post.get("relevance") is None]
+        for post, s in zip(unscored, self.score(unscored)):
+            post["relevance"] = float(s)
+        if unscored:
+            set_post_relevance([(post["id"], post["relevance"]) for post in unscored])
+        kept = [post for post in posts if post["relevance"] >= self.threshold]
+        skipped = [post for post in posts if post["relevance"] < self.threshold]
+        return kept, skipped
+
+    def score_backlog(self, batch_size: int = 2000) -> int:
+        """Score every unanalyzed post that has no relevance yet.
+
+        Stored relevance feeds the backlog priority, and posts below the
+        threshold drop out of the backlog before anyone claims them.
+        Returns how many were dropped.
+        """
+        scored = skipped = 0
+        while posts := get_unscored_posts(batch_size):
+            scores = self.score(posts)
+            set_post_relevance([(post["id"], float(s)) for post, s in zip(posts, scores)])
+            scored += len(posts)
+            skipped += int((scores < self.threshold).sum())
+        if scored:
+            logger.info(f"Scored relevance for {scored} backlog posts, {skipped} below the threshold")
+        return skipped
+
+    @classmethod
+    def fit(cls, posts: list[dict], labels: np.ndarray, epochs: int = 8, batch_size: int = 256,
+            learning_rate: float = 0.5, l2: float = 1e-6, seed: int = 0) -> "RelevanceModel":
+        """Mini-batch AdaGrad on log loss, with classes weighted to balance."""
+        rng = np.random.default_rng(seed)
+        rows, cols, values = vectorize(posts)
+        labels = labels.astype(np.float64)
+        positive = labels.mean()
+        sample_weight = np.where(labels == 1, 0.5 / max(positive, 1e-6), 0.5 / max(1 - positive, 1e-6))
+        # Row boundaries, so a batch of posts maps to a slice of the sparse arrays
+        starts = np.searchsorted(rows, np.arange(len(posts) + 1))
+
+        weights = np.zeros(HASH_DIM)
+        bias = 0.0
+        grad_sq = np.full(HASH_DIM, 1e-8)
+        bias_sq = 1e-8
+        for _ in range(epochs):
+            order = rng.permutation(len(posts))
+            for i in range(0, len(order), batch_size):
+                batch = np.sort(order[i:i + batch_size])
+                index = np.concatenate([np.arange(starts[b], starts[b + 1]) for b in batch])
+                local = np.repeat(np.arange(len(batch)), starts[batch + 1] - starts[batch])
+                b_cols, b_values = cols[index], values[index]
+                logits = np.bincount(local, weights=weights[b_cols] * b_values, minlength=len(batch)) + bias
+                error = (_sigmoid(logits) - labels[batch]) * sample_weight[batch] / len(batch)
+                grad = np.bincount(b_cols, weights=b_values * error[local], minlength=HASH_DIM)
+                touched = np.unique(b_cols)
+                grad[touched] += l2 * weights[touched]
+                grad_sq[touched] += grad[touched] ** 2
+                weights[touched] -= learning_rate * grad[touched] / np.sqrt(grad_sq[touched])
+                bias_grad = error.sum()
+                bias_sq += bias_grad ** 2
+                bias -= learning_rate * bias_grad / np.sqrt(bias_sq)
+        return cls(weights.astype(np.float32), float(bias))
+
+    def to_blob(self) -> bytes:
+        return zlib.compress(self.weights.astype(np.float32).tobytes())
+
+    @classmethod
+    def load(cls) -> "RelevanceModel | None":
+        """The stored model, or None if none has been trained yet."""
+        row = load_relevance_model()
+        if not row:
+            return None
+        weights = np.frombuffer(zlib.decompress(row["weights"]), dtype=np.float32)
+        return cls(weights, row["bias"], row["threshold"], row["metrics"])
+
+
+def labels_for(posts: list[dict]) -> np.ndarray:
+    """1 for real pain points: the LLM scored them above RELEVANCE_LABEL_SCORE."""
+    return np.array([(post["opportunity_score"] or 0) > RELEVANCE_LABEL_SCORE for post in posts], dtype=np.int8)
+
+
+def evaluate(scores: np.ndarray, labels: np.ndarray, threshold: float) -> dict:
+    """Precision and recall of the "real pain point" class, plus the share of
+    LLM calls the threshold would avoid."""
+    kept = scores >= threshold
+    true_positive = int((kept & (labels == 1)).sum())
+    return {
+        "posts": int(len(labels)),
+        "positive_rate": round(float(labels.mean()), 4) if len(labels) else 0.0,
+        "precision": round(true_positive / max(int(kept.sum()), 1), 4),
+        "recall": round(true_positive / max(int(labels.sum()), 1), 4),
+        "calls_avoided": int((~kept).sum()),
+        "calls_avoided_rate": round(float((~kept).mean()), 4) if len(labels) else 0.0,
+    }
+
+
+def pick_threshold(scores: np.ndarray, labels: np.ndarray, target_recall: float) -> float:
+    """Threshold that skips the most posts while keeping `target_recall` of the
+    real pain points."""
+    positives = np.sort(scores[labels == 1])
+    if not len(positives):
+        return 0.0
+    # Dropping the lowest-scoring (1 - target_recall) share of positives
+    index = int(np.floor(len(positives) * (1 - target_recall)))
+    cutoff = float(positives[min(index, len(positives) - 1)])
+    # Any threshold down to the next lower score skips the same posts; the
+    # midpoint leaves a margin for unseen real pain points
+    below = scores[scores < cutoff]
+    return (cutoff + float(below.max())) / 2 if len(below) else cutoff
+
+
+def train(target_recall: float = RELEVANCE_TARGET_RECALL, holdout: float = 0.2,
+          min_posts: int = RELEVANCE_MIN_POSTS, seed: int = 0) -> dict:
+    """Train on stored analyses and save the model.
+
+    A random `holdout` share of posts is kept out of training. The threshold
+    is tuned on it to keep `target_recall` of real pain points, and the
+    returned metrics are measured on it.
+    """
+    posts = get_labeled_posts()
+    labels = labels_for(posts)
+    if len(posts) < min_posts or labels.min(initial=1) == labels.max(initial=0):
+        raise ValueError(f"Need at least {min_posts} analyzed posts with both relevant and "
+                         f"irrelevant examples to train (have {len(posts)})")
+    order = np.random.default_rng(seed).permutation(len(posts))
+    cut = int(len(posts) * (1 - holdout))
+    train_idx, test_idx = order[:cut], order[cut:]
+
+    model = RelevanceModel.fit([posts[i] for i in train_idx], labels[train_idx], seed=seed)
+    scores = model.score([posts[i] for i in test_idx])
+    model.threshold = pick_threshold(scores, labels[test_idx], target_recall)
+    model.metrics = {"holdout": evaluate(scores, labels[test_idx], model.threshold),
+                     "train_posts": int(len(train_idx)), "target_recall": target_recall}
+    save_relevance_model(model.to_blob(), model.bias, model.threshold, model.metrics)
+    logger.info(f"Relevance model trained on {len(train_idx)} posts, threshold {model.threshold:.3f}: "
+                f"{model.metrics['holdout']}")
+    return model.metrics
+
+
+def report() -> dict | None:
+    """Evaluate the stored model on every labeled post in the database."""
+    model = RelevanceModel.load()
+    if not model:
+        return None
+    posts = get_labeled_posts()
+    labels = labels_for(posts)
+    return {
+        "threshold": round(model.threshold, 4),
+        "trained": model.metrics,
+        "stored_data": evaluate(model.score(posts), labels, model.threshold),
+    }
@@ -2,78 +2,194 @@
 import re
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import partial
 import praw
+import prawcore
 from config import (
     REDDIT_CLIENT_ID, REDDIT_CLIENT_SECRET, REDDIT_USER_AGENT,
-    SUBREDDITS, SCRAPE_LIMIT, PAIN_KEYWORDS,
+    SUBREDDITS, SCRAPE_LIMIT, SCRAPE_MAX_PAGES, SCRAPE_CONCURRENCY, REDDIT_REQUESTS_PER_MINUTE,
 )
-from database import insert_post
+from checkpoints import FeedCheckpoint, SubredditCheckpoints
+from database import PostWriter, start_scrape_run, finish_scrape_run
+from ratelimit import TokenBucket
+from keywords import find_pain_keywords
+from seen import SeenIds
 
 logger = logging.getLogger(__name__)
 
 
-def get_reddit_client() -> praw.Reddit:
+class RateLimitedRequestor(prawcore.Requestor):
+    """prawcore requestor that takes a token from a shared bucket before every
+    HTTP request, so all PRAW clients in a scrape share one request budget."""
+
+    def __init__(self, *args, limiter: TokenBucket, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    def request(self, *args, **kwargs):
+        self.limiter.acquire()
+        return super().request(*args, **kwargs)
+
+
+def get_rate_limiter() -> TokenBucket:
+    return TokenBucket(rate=REDDIT_REQUESTS_PER_MINUTE / 60,
+                       capacity=max(1, REDDIT_REQUESTS_PER_MINUTE // 60))
+
+
+def get_reddit_client(limiter: TokenBucket = None) -> praw.Reddit:
     if not REDDIT_CLIENT_ID or not REDDIT_CLIENT_SECRET:
         raise ValueError(
             "Reddit API credentials not configured. "
             "Set REDDIT_CLIENT_ID and REDDIT_CLIENT_SECRET in .env"
         )
+    kwargs = {}
+    if limiter is not None:
+        kwargs = {"requestor_class": RateLimitedRequestor, "requestor_kwargs": {"limiter": limiter}}
     return praw.Reddit(
         client_id=REDDIT_CLIENT_ID,
         client_secret=REDDIT_CLIENT_SECRET,
         user_agent=REDDIT_USER_AGENT,
+        **kwargs,
     )
 
 
-def matches_pain_keywords(text: str) -> bool:
-    """Check if text contains pain-point language."""
-    text_lower = text.lower()
-    return any(kw in text_lower for kw in PAIN_KEYWORDS)
+# PRAW objects aren't thread-safe, so each pool worker builds its own client
+_worker = threading.local()
+
+
+def _init_worker(reddit_factory):
+    _worker.reddit = reddit_factory()
+
+
+def fetch_comment_posts(reddit: praw.Reddit, subreddit_name: str, submission_id: str, title: str) -> list[dict]:
+    """Fetch a submission's top comments and return those with pain keywords."""
+    submission = reddit.submission(id=submission_id)
+    submission.comments.replace_more(limit=0)
+    posts = []
+    for comment in submission.comments[:10]:
+        comment_keywords = find_pain_keywords(getattr(comment, 'body', ''))
+        if comment_keywords:
+            posts.append({
+                "reddit_id": f"t1_{comment.id}",
+                "subreddit": subreddit_name,
+                "title": title,
+                "body": comment.body[:3000],
+                "author": str(comment.author) if comment.author else "[deleted]",
+                "url": f"https://reddit.com{comment.permalink}",
+                "score": comment.score,
+                "num_comments": 0,
+                "created_utc": comment.created_utc,
+                "post_type": "comment",
+                "parent_id": f"t3_{submission_id}",
+                "matched_keywords": comment_keywords,
+            })
+    return posts
+
+
+def _pooled_comment_posts(subreddit_name: str, submission_id: str, title: str) -> list[dict]:
+    return fetch_comment_posts(_worker.reddit, subreddit_name, submission_id, title)
+
 
+def _submission_key(submission) -> tuple[str, float]:
+    return f"t3_{submission.id}", submission.created_utc
 
-def scrape_subreddit(reddit: praw.Reddit, subreddit_name: str, limit: int = SCRAPE_LIMIT) -> dict:
-    """Scrape a single subreddit for pain-point posts."""
-    stats = {"found": 0, "matched": 0}
+
+def _listing_kwargs(checkpoint: FeedCheckpoint, page_size: int) -> dict:
+    """One page on a feed's first read; once it has a mark, page on (stopping
+    at the mark) for up to SCRAPE_MAX_PAGES pages."""
+    if checkpoint.has_mark:
+        return {"limit": page_size * SCRAPE_MAX_PAGES, "request_limit": page_size}
+    return {"limit": page_size}
+
+
+def scrape_subreddit(reddit: praw.Reddit, subreddit_name: str, limit: int = SCRAPE_LIMIT,
+                     comment_pool: ThreadPoolExecutor = None, checkpoints: SubredditCheckpoints = None,
+                     run_id: str = None, known: SeenIds = None, on_insert=None) -> dict:
+    """Scrape a single subreddit for pain-point posts.
+
+    With a comment_pool (whose workers were set up by _init_worker), comment
+    trees of matched submissions are fetched concurrently. With checkpoints,
+    /new and the keyword searches only read items newer than the last run,
+    and the new marks are saved once the posts are written. Submissions in
+    `known` are already stored and skip matching, writes and comment fetches.
+    A submission whose comments can't be fetched is left unstored and its
+    feeds keep their old marks, so the next run retries it.
+    """
+    started = time.monotonic()
+    stats = {"found": 0, "matched": 0, "known": 0, "errors": 0, "seconds": 0.0}
     sub = reddit.subreddit(subreddit_name)
+    checkpoints = checkpoints or SubredditCheckpoints(subreddit_name, full=True)
 
     # Collect from multiple feeds
     seen_ids = set()
     submissions = []
+    sources: dict[str, list[FeedCheckpoint]] = {}  # Submission id -> checkpointed feeds that listed it
+
+    def collect(source, feed: FeedCheckpoint = None):
+        for submission in source:
+            if feed:
+                sources.setdefault(submission.id, []).append(feed)
+            if submission.id not in seen_ids:
+                seen_ids.add(submission.id)
+                submissions.append(submission)
 
+    new_feed = checkpoints.feed("new")
     try:
-        for source_name, source in [
-            ("hot", sub.hot(limit=limit)),
-            ("new", sub.new(limit=limit)),
-            ("top_week", sub.top(time_filter="week", limit=limit)),
-        ]:
-            for submission in source:
-                if submission.id not in seen_ids:
-                    seen_ids.add(submission.id)
-                    submissions.append(submission)
-
-        # Also search with pain keywords (top 5 most distinctive ones)
+        try:
+            collect(new_feed.take_new(sub.new(**_listing_kwargs(new_feed, limit)), _submission_key), new_feed)
+        except Exception:
+            new_feed.failed = True
+            raise
+
+        # Hot and top re-rank older posts, which /new already delivered when it
+        # paged back to its mark; they are only read on a first or full scrape,
+        # or to fill the gap when /new didn't get that far
+        if not new_feed.caught_up:
+            for source_name, source in [
+                ("hot", sub.hot(limit=limit)),
+                ("top_week", sub.top(time_filter="week", limit=limit)),
+            ]:
+                collect(source)
+
+        # Also search with pain keywords (top 5 most distinctive ones); once a
+        # search has a mark it is sorted by new so it can stop there
         search_keywords = ["I wish", "frustrated with", "need a tool", "looking for", "alternative to"]
         for kw in search_keywords:
+            feed = checkpoints.feed(f"search:{kw}")
             try:
-                for submission in sub.search(kw, limit=min(limit, 25), sort="relevance", time_filter="month"):
-                    if submission.id not in seen_ids:
-                        seen_ids.add(submission.id)
-                        submissions.append(submission)
+                results = sub.search(kw, sort="new" if feed.has_mark else "relevance", time_filter="month",
+                                     **_listing_kwargs(feed, min(limit, 25)))
+                collect(feed.take_new(results, _submission_key), feed)
             except Exception as e:
+                feed.failed = True
+                stats["errors"] += 1
                 logger.warning(f"Search failed for '{kw}' in r/{subreddit_name}: {e}")
 
     except Exception as e:
         logger.error(f"Failed to scrape r/{subreddit_name}: {e}")
+        stats["errors"] += 1
+        stats["seconds"] = round(time.monotonic() - started, 2)
         return stats
 
+    writer = PostWriter(known=known, on_insert=on_insert)
+    pending = {}
+    comment_jobs = {}
     for submission in submissions:
         stats["found"] += 1
+        if known is not None and f"t3_{submission.id}" in known:
+            stats["known"] += 1
+            continue
         full_text = f"{submission.title} {submission.selftext}"
 
-        if matches_pain_keywords(full_text):
-            stats["matched"] += 1
-            post_id = insert_post({
+        keywords = find_pain_keywords(full_text)
+        if keywords:
+            # Written once its comments are in: if they can't be fetched, the
+            # submission stays unstored and its feeds' checkpoints stay put,
+            # so the next run reads it again instead of skipping it as known
+            pending[submission.id] = {
                 "reddit_id": f"t3_{submission.id}",
                 "subreddit": subreddit_name,
                 "title": submission.title,
@@ -84,55 +200,105 @@ def scrape_subreddit(reddit: praw.Reddit, subreddit_name: str, limit: int = SCRA
                 "num_comments": submission.num_comments,
                 "created_utc": submission.created_utc,
                 "post_type": "submission",
-            })
-
+                "matched_keywords": keywords,
+            }
             # Also check top comments
-            try:
-                submission.comments.replace_more(limit=0)
-                for comment in submission.comments[:10]:
-                    if hasattr(comment, 'body') and matches_pain_keywords(comment.body):
-                        insert_post({
-                            "reddit_id": f"t1_{comment.id}",
-                            "subreddit": subreddit_name,
-                            "title": submission.title,
-                            "body": comment.body[:3000],
-                            "author": str(comment.author) if comment.author else "[deleted]",
-                            "url": f"https://reddit.com{comment.permalink}",
-                            "score": comment.score,
-                            "num_comments": 0,
-                            "created_utc": comment.created_utc,
-                            "post_type": "comment",
-                            "parent_id": f"t3_{submission.id}",
-                        })
-                        stats["matched"] += 1
-            except Exception as e:
-                logger.warning(f"Failed to process comments for {submission.id}: {e}")
+            if comment_pool is not None:
+                future = comment_pool.submit(_pooled_comment_posts, subreddit_name, submission.id, submission.title)
+                comment_jobs[future] = submission.id
+            else:
+                comment_jobs[submission.id] = submission
+
+    if comment_pool is not None:
+        results = ((comment_jobs[future], future.result) for future in as_completed(comment_jobs))
+    else:
+        results = ((submission_id, partial(fetch_comment_posts, reddit, subreddit_name, submission_id, s.title))
+                   for submission_id, s in comment_jobs.items())
+    for submission_id, get_posts in results:
+        try:
+            comment_posts = get_posts()
+        except Exception as e:
+            stats["errors"] += 1
+            for feed in sources.get(submission_id, ()):
+                feed.failed = True
+            logger.warning(f"Failed to process comments for {submission_id}, will retry next run: {e}")
+            continue
+        for post in [pending[submission_id], *comment_posts]:
+            writer.add(post)
+            stats["matched"] += 1
+    writer.flush()
+    checkpoints.save(run_id)
 
-    logger.info(f"r/{subreddit_name}: found {stats['found']} posts, {stats['matched']} matched pain keywords")
+    stats["seconds"] = round(time.monotonic() - started, 2)
+    logger.info(
+        f"r/{subreddit_name}: found {stats['found']} posts, {stats['matched']} matched pain keywords "
+        f"({stats['errors']} errors, {stats['seconds']}s)"
+    )
     return stats
 
 
-def run_scrape(subreddits: list[str] = None, limit: int = SCRAPE_LIMIT) -> dict:
-    """Run a full scrape across all configured subreddits."""
-    subreddits = subreddits or SUBREDDITS
-    reddit = get_reddit_client()
+def run_scrape(subreddits: list[str] = None, limit: int = SCRAPE_LIMIT,
+               concurrency: int = SCRAPE_CONCURRENCY, reddit_factory=None, full: bool = False,
+               on_progress=None, on_insert=None) -> dict:
+    """Run a scrape across all configured subreddits, recorded in scrape_runs.
 
-    total_stats = {"found": 0, "matched": 0, "subreddits_scraped": 0}
+    Feeds resume from their checkpoints unless `full` is set. on_progress,
+    if given, is called with the running totals after each subreddit, and
+    on_insert with each batch of newly stored posts.
 
-    for sub_name in subreddits:
-        sub_name = sub_name.strip()
-        if not sub_name:
-            continue
+    Up to `concurrency` subreddits are scraped at once, with comment trees
+    fetched on a second pool of the same size. Every worker gets its own
+    client from reddit_factory (default: a PRAW client drawing on one shared
+    REDDIT_REQUESTS_PER_MINUTE budget); pass a fake factory to test offline.
+    """
+    subreddits = [s.strip() for s in (subreddits or SUBREDDITS) if s.strip()]
+    if reddit_factory is None:
+        limiter = get_rate_limiter()
+        reddit_factory = partial(get_reddit_client, limiter=limiter)
+    reddit_factory()  # Fail fast on missing credentials, before starting workers
+
+    total_stats = {"found": 0, "matched": 0, "known": 0, "errors": 0, "subreddits_scraped": 0, "subreddits": {}}
+    started = time.monotonic()
+
+    run_id = start_scrape_run(subreddits, "praw")
+    known = SeenIds.load()
+
+    def scrape(sub_name):
         logger.info(f"Scraping r/{sub_name}...")
-        stats = scrape_subreddit(reddit, sub_name, limit)
-        total_stats["found"] += stats["found"]
-        total_stats["matched"] += stats["matched"]
-        total_stats["subreddits_scraped"] += 1
-        time.sleep(1)  # Be nice to Reddit's API
+        return scrape_subreddit(_worker.reddit, sub_name, limit, comment_pool=comment_pool,
+                                checkpoints=SubredditCheckpoints(sub_name, full=full), run_id=run_id,
+                                known=known, on_insert=on_insert)
+
+    # Separate pools, so subreddit workers waiting on comment fetches can't
+    # starve the pool those fetches run on
+    concurrency = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency, initializer=_init_worker,
+                            initargs=(reddit_factory,)) as comment_pool, \
+            ThreadPoolExecutor(max_workers=concurrency, initializer=_init_worker,
+                               initargs=(reddit_factory,)) as subreddit_pool:
+        futures = {subreddit_pool.submit(scrape, sub_name): sub_name for sub_name in subreddits}
+        for future in as_completed(futures):
+            sub_name = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                logger.error(f"Failed to scrape r/{sub_name}: {e}")
+                stats = {"found": 0, "matched": 0, "known": 0, "errors": 1, "seconds": 0.0}
+            total_stats["found"] += stats["found"]
+            total_stats["matched"] += stats["matched"]
+            total_stats["known"] += stats["known"]
+            total_stats["errors"] += stats["errors"]
+            total_stats["subreddits_scraped"] += 1
+            total_stats["subreddits"][sub_name] = stats
+            if on_progress:
+                on_progress(total_stats)
 
+    total_stats["seconds"] = round(time.monotonic() - started, 2)
+    finish_scrape_run(run_id, total_stats)
     logger.info(
         f"Scrape complete: {total_stats['subreddits_scraped']} subreddits, "
-        f"{total_stats['found']} posts found, {total_stats['matched']} matched"
+        f"{total_stats['found']} posts found, {total_stats['matched']} matched "
+        f"in {total_stats['seconds']}s"
     )
     return total_stats
 
@@ -1,110 +1,265 @@
 """Reddit scraper using public JSON API (no authentication needed)."""
 import re
 import time
+import random
+import asyncio
 import logging
 import httpx
 from datetime import datetime
-from config import SUBREDDITS, SCRAPE_LIMIT, PAIN_KEYWORDS
-from database import insert_post
+from config import SUBREDDITS, SCRAPE_LIMIT, SCRAPE_MAX_PAGES
+from checkpoints import FeedCheckpoint, SubredditCheckpoints
+from database import PostWriter, start_scrape_run, finish_scrape_run
+from keywords import find_pain_keywords
+from seen import SeenIds
+from ratelimit import AsyncTokenBucket
 
 logger = logging.getLogger(__name__)
 
 USER_AGENT = "pain-point-discovery/1.0 (research tool)"
 BASE_URL = "https://www.reddit.com"
 REQUEST_DELAY = 2  # Reddit rate limits unauthenticated to ~10 req/min
+ASYNC_CONCURRENCY = 4  # Max in-flight requests in async mode
+ASYNC_BURST = 3  # Requests the async token bucket may bank while idle
+MAX_RETRIES = 3
 
+# Search with pain-point keywords
+SEARCH_TERMS = ["frustrated", "i wish", "need a tool", "looking for", "annoying",
+                "alternative to", "why isn't there", "would pay for", "tired of",
+                "can't find", "doesn't exist", "pain point"]
 
-def matches_pain_keywords(text: str) -> bool:
-    text_lower = text.lower()
-    return any(kw in text_lower for kw in PAIN_KEYWORDS)
 
+def _search_request(subreddit_name: str, term: str, limit: int,
+                    incremental: bool = False, after: str = None) -> tuple[str, dict]:
+    """Build a search request. Checkpointed searches sort by new so paging can
+    stop at the mark; the first read of a search ranks by relevance."""
+    url = f"{BASE_URL}/r/{subreddit_name}/search.json"
+    params = {
+        "q": term,
+        "restrict_sr": "on",
+        "sort": "new" if incremental else "relevance",
+        "t": "month",
+        "limit": min(limit, 25),
+    }
+    if after:
+        params["after"] = after
+    return url, params
 
-def scrape_subreddit_public(subreddit_name: str, limit: int = SCRAPE_LIMIT) -> dict:
-    """Scrape a subreddit using Reddit's public JSON API."""
-    stats = {"found": 0, "matched": 0, "errors": 0}
-    client = httpx.Client(headers={"User-Agent": USER_AGENT}, timeout=30, follow_redirects=True)
 
-    # Search with pain-point keywords
-    search_terms = ["frustrated", "i wish", "need a tool", "looking for", "annoying",
-                    "alternative to", "why isn't there", "would pay for", "tired of",
-                    "can't find", "doesn't exist", "pain point"]
+def _listing_key(pd: dict) -> tuple[str, float]:
+    return pd.get("name", ""), pd.get("created_utc")
+
+
+def _max_pages(feed: FeedCheckpoint) -> int:
+    return SCRAPE_MAX_PAGES if feed.has_mark else 1
+
+
+def _ingest_listing(pd: dict, subreddit_name: str, seen_ids: set, writer: PostWriter, stats: dict):
+    """Dedupe, keyword-filter and buffer one post from a search listing.
+
+    Posts in writer.known are already stored and are skipped before matching.
+    """
+    post_id = pd.get("name", "")
+
+    if post_id in seen_ids:
+        return
+    seen_ids.add(post_id)
+    stats["found"] += 1
+    if writer.known is not None and post_id in writer.known:
+        stats["known"] += 1
+        return
+
+    title = pd.get("title", "")
+    body = pd.get("selftext", "")
+    full_text = f"{title} {body}"
+
+    keywords = find_pain_keywords(full_text)
+    if not keywords:
+        return
+
+    stats["matched"] += 1
+    writer.add({
+        "reddit_id": post_id,
+        "subreddit": subreddit_name,
+        "title": title,
+        "body": body[:5000],
+        "author": pd.get("author", "[deleted]"),
+        "url": f"https://reddit.com{pd.get('permalink', '')}",
+        "score": pd.get("score", 0),
+        "num_comments": pd.get("num_comments", 0),
+        "created_utc": pd.get("created_utc", 0),
+        "post_type": "submission",
+        "parent_id": None,
+        "matched_keywords": keywords,
+    })
+
+
+def scrape_subreddit_public(subreddit_name: str, limit: int = SCRAPE_LIMIT,
+                            checkpoints: SubredditCheckpoints = None, run_id: str = None,
+                            known: SeenIds = None, on_insert=None) -> dict:
+    """Scrape a subreddit using Reddit's public JSON API.
+
+    Searches that have a checkpoint page through results newest-first and
+    stop at the mark; the new marks are saved once the posts are written.
+    """
+    stats = {"found": 0, "matched": 0, "known": 0, "errors": 0}
+    client = httpx.Client(headers={"User-Agent": USER_AGENT}, timeout=30, follow_redirects=True)
+    checkpoints = checkpoints or SubredditCheckpoints(subreddit_name, full=True)
 
     seen_ids = set()
+    writer = PostWriter(known=known, on_insert=on_insert)
 
-    for term in search_terms:
-        try:
-            url = f"{BASE_URL}/r/{subreddit_name}/search.json"
-            params = {
-                "q": term,
-                "restrict_sr": "on",
-                "sort": "relevance",
-                "t": "month",
-                "limit": min(limit, 25),
-            }
-            resp = client.get(url, params=params)
-            if resp.status_code != 200:
-                logger.warning(f"  HTTP {resp.status_code} for r/{subreddit_name} search '{term}'")
+    for term in SEARCH_TERMS:
+        feed = checkpoints.feed(f"search:{term}")
+        after = None
+        for _ in range(_max_pages(feed)):
+            try:
+                url, params = _search_request(subreddit_name, term, limit, feed.has_mark, after)
+                resp = client.get(url, params=params)
+                if resp.status_code != 200:
+                    logger.warning(f"  HTTP {resp.status_code} for r/{subreddit_name} search '{term}'")
+                    stats["errors"] += 1
+                    feed.failed = True
+                    time.sleep(REQUEST_DELAY)
+                    break
+
+                listing = resp.json().get("data", {})
+                posts = (post.get("data", {}) for post in listing.get("children", []))
+
+                for pd in feed.take_new(posts, _listing_key):
+                    _ingest_listing(pd, subreddit_name, seen_ids, writer, stats)
+
+                time.sleep(REQUEST_DELAY)
+
+            except Exception as e:
+                logger.error(f"  Error searching r/{subreddit_name} for '{term}': {e}")
                 stats["errors"] += 1
+                feed.failed = True
                 time.sleep(REQUEST_DELAY)
-                continue
-
-            data = resp.json()
-            posts = data.get("data", {}).get("children", [])
-
-            for post in posts:
-                pd = post.get("data", {})
-                post_id = pd.get("name", "")
-
-                if post_id in seen_ids:
-                    continue
-                seen_ids.add(post_id)
-                stats["found"] += 1
-
-                title = pd.get("title", "")
-                body = pd.get("selftext", "")
-                full_text = f"{title} {body}"
-
-                if not matches_pain_keywords(full_text):
-                    continue
-
-                stats["matched"] += 1
-                insert_post({
-                    "reddit_id": post_id,
-                    "subreddit": subreddit_name,
-                    "title": title,
-                    "body": body[:5000],
-                    "author": pd.get("author", "[deleted]"),
-                    "url": f"https://reddit.com{pd.get('permalink', '')}",
-                    "score": pd.get("score", 0),
-                    "num_comments": pd.get("num_comments", 0),
-                    "created_utc": pd.get("created_utc", 0),
-                    "post_type": "submission",
-                    "parent_id": None,
-                })
-
-            time.sleep(REQUEST_DELAY)
-
-        except Exception as e:
-            logger.error(f"  Error searching r/{subreddit_name} for '{term}': {e}")
-            stats["errors"] += 1
-            time.sleep(REQUEST_DELAY)
+                break
+
+            after = listing.get("after")
+            if feed.caught_up or not after:
+                break
 
+    writer.flush()
+    checkpoints.save(run_id)
     client.close()
     return stats
 
 
-def scrape_all_public(subreddits: list = None, limit: int = SCRAPE_LIMIT) -> dict:
-    """Scrape all configured subreddits using public API."""
+def scrape_all_public(subreddits: list = None, limit: int = SCRAPE_LIMIT, full: bool = False,
+                      on_progress=None, on_insert=None) -> dict:
+    """Scrape all configured subreddits using public API.
+
+    Searches resume from their checkpoints unless `full` is set. on_progress,
+    if given, is called with the running totals after each subreddit, and
+    on_insert with each batch of newly stored posts.
+    """
     subs = subreddits or SUBREDDITS
-    total_stats = {"found": 0, "matched": 0, "errors": 0}
+    total_stats = {"found": 0, "matched": 0, "known": 0, "errors": 0}
+    run_id = start_scrape_run(subs, "public")
+    known = SeenIds.load()
 
     logger.info(f"🔍 Scraping {len(subs)} subreddits (public API, no auth needed)")
     for sub_name in subs:
         logger.info(f"  📌 r/{sub_name}...")
-        stats = scrape_subreddit_public(sub_name, limit)
+        stats = scrape_subreddit_public(sub_name, limit, SubredditCheckpoints(sub_name, full=full), run_id,
+                                        known, on_insert)
         logger.info(f"     Found {stats['found']}, matched {stats['matched']}")
         for k in total_stats:
             total_stats[k] += stats[k]
+        if on_progress:
+            on_progress(total_stats)
+
+    finish_scrape_run(run_id, total_stats)
+    logger.info(f"✅ Done! Total: {total_stats['found']} found, {total_stats['matched']} matched pain points")
+    return total_stats
+
+
+def _retry_delay(resp: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying, honouring Retry-After when present."""
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return REQUEST_DELAY * (2 ** attempt) + random.uniform(0, 1)
+
+
+async def _search_async(client: httpx.AsyncClient, bucket: AsyncTokenBucket,
+                        semaphore: asyncio.Semaphore, subreddit_name: str,
+                        term: str, limit: int, incremental: bool = False, after: str = None) -> dict:
+    """Fetch one page of a subreddit search, retrying on 429 and 5xx responses."""
+    url, params = _search_request(subreddit_name, term, limit, incremental, after)
+    for attempt in range(MAX_RETRIES + 1):
+        await bucket.acquire()
+        async with semaphore:
+            resp = await client.get(url, params=params)
+        if resp.status_code == 429 or resp.status_code >= 500:
+            if attempt == MAX_RETRIES:
+                break
+            delay = _retry_delay(resp, attempt)
+            logger.warning(f"  HTTP {resp.status_code} for r/{subreddit_name} search '{term}', "
+                           f"retrying in {delay:.1f}s")
+            bucket.pause(delay)
+            continue
+        if resp.status_code != 200:
+            break
+        return resp.json().get("data", {})
+    raise RuntimeError(f"HTTP {resp.status_code}")
+
+
+async def _scrape_all_async(subs: list, limit: int, full: bool = False, run_id: str = None,
+                            on_progress=None, on_insert=None) -> dict:
+    total_stats = {"found": 0, "matched": 0, "known": 0, "errors": 0}
+    bucket = AsyncTokenBucket(rate=1 / REQUEST_DELAY, capacity=ASYNC_BURST)
+    semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+    seen_ids = {sub_name: set() for sub_name in subs}
+    checkpoints = {sub_name: SubredditCheckpoints(sub_name, full=full) for sub_name in subs}
+    writer = PostWriter(known=SeenIds.load(), on_insert=on_insert)
+
+    async with httpx.AsyncClient(headers={"User-Agent": USER_AGENT}, timeout=30,
+                                 follow_redirects=True) as client:
+        async def run(sub_name, term):
+            feed = checkpoints[sub_name].feed(f"search:{term}")
+            after = None
+            try:
+                for _ in range(_max_pages(feed)):
+                    listing = await _search_async(client, bucket, semaphore, sub_name, term, limit,
+                                                  feed.has_mark, after)
+                    posts = (post.get("data", {}) for post in listing.get("children", []))
+                    for pd in feed.take_new(posts, _listing_key):
+                        _ingest_listing(pd, sub_name, seen_ids[sub_name], writer, total_stats)
+                    after = listing.get("after")
+                    if feed.caught_up or not after:
+                        break
+            except Exception as e:
+                logger.error(f"  Error searching r/{sub_name} for '{term}': {e}")
+                total_stats["errors"] += 1
+                feed.failed = True
+            if on_progress:
+                on_progress(total_stats)
+
+        await asyncio.gather(*(run(sub_name, term) for sub_name in subs for term in SEARCH_TERMS))
+
+    writer.flush()
+    for sub_checkpoints in checkpoints.values():
+        sub_checkpoints.save(run_id)
+    return total_stats
+
+
+def scrape_all_public_async(subreddits: list = None, limit: int = SCRAPE_LIMIT, full: bool = False,
+                            on_progress=None, on_insert=None) -> dict:
+    """Scrape all subreddits concurrently, one task per subreddit x search term.
 
+    Requests share a single token bucket refilling at 1 / REQUEST_DELAY per
+    second, so the overall request budget matches the sequential scraper.
+    """
+    subs = [s.strip() for s in (subreddits or SUBREDDITS) if s.strip()]
+    logger.info(f"🔍 Scraping {len(subs)} subreddits (public API, async)")
+    run_id = start_scrape_run(subs, "public-async")
+    total_stats = asyncio.run(_scrape_all_async(subs, limit, full, run_id, on_progress, on_insert))
+    finish_scrape_run(run_id, total_stats)
     logger.info(f"✅ Done! Total: {total_stats['found']} found, {total_stats['matched']} matched pain points")
     return total_stats
@@ -0,0 +1,96 @@
+"""Compact in-memory set of reddit_ids that are already stored.
+
+Reddit ids are base-36 numbers, so "t3_abc123" packs into one 64-bit int
+(the id shifted left one bit, the low bit for t1/t3). Known ids are kept
+as a sorted array('q') and looked up with bisect: 8 bytes per post, so a
+few million posts cost tens of MB, against ~100 bytes each for a set of
+strings. Unlike a Bloom filter there are no false positives, which
+matters here because a false positive would silently drop a new post.
+Ids that don't fit the packing go into a small fallback set.
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from database import iter_reddit_ids
+
+_KINDS = {"t1_": 0, "t3_": 1}
+_MAX_ID = 1 << 62
+_LOAD_RUN = 65536
+
+
+def _pack(reddit_id: str):
+    kind = _KINDS.get(reddit_id[:3])
+    digits = reddit_id[3:]
+    # int(..., 36) also accepts "_", "+", whitespace and upper case
+    if kind is None or not (digits.isascii() and digits.isalnum()) or digits != digits.lower():
+        return None
+    value = int(digits, 36)
+    return value << 1 | kind if value < _MAX_ID else None
+
+
+class SeenIds:
+    """Thread-safe membership set of reddit_ids.
+
+    New ids collect in a small set and are merged into the sorted array
+    once it has grown by about 1/16th, keeping merges rare and cheap.
+    """
+
+    def __init__(self, reddit_ids=()):
+        self.other: set[str] = set()
+        # Sort in runs and merge them, so loading millions of ids never holds
+        # more than one run as Python ints
+        runs, run = [], []
+        for reddit_id in reddit_ids:
+            packed = _pack(reddit_id)
+            if packed is None:
+                self.other.add(reddit_id)
+                continue
+            run.append(packed)
+            if len(run) >= _LOAD_RUN:
+                runs.append(array("q", sorted(run)))
+                run = []
+        runs.append(array("q", sorted(run)))
+        self.ids = array("q", heapq.merge(*runs))  # Duplicates are harmless to bisect
+        self.pending: set[int] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls) -> "SeenIds":
+        """Build from every reddit_id in the posts table."""
+        return cls(iter_reddit_ids())
+
+    def _in_array(self, packed: int) -> bool:
+        i = bisect_left(self.ids, packed)
+        return i < len(self.ids) and self.ids[i] == packed
+
+    def __contains__(self, reddit_id: str) -> bool:
+        packed = _pack(reddit_id)
+        with self._lock:
+            if packed is None:
+                return reddit_id in self.other
+            return packed in self.pending or self._in_array(packed)
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.pending) + len(self.other)
+
+    def add(self, reddit_id: str):
+        self.update((reddit_id,))
+
+    def update(self, reddit_ids):
+        with self._lock:
+            for reddit_id in reddit_ids:
+                packed = _pack(reddit_id)
+                if packed is None:
+                    self.other.add(reddit_id)
+                elif not self._in_array(packed):
+                    self.pending.add(packed)
+            if len(self.pending) > max(4096, len(self.ids) >> 4):
+                # Both runs are already sorted, which sorted() merges in linear time
+                self.ids = array("q", sorted(self.ids + array("q", sorted(self.pending))))
+                self.pending = set()
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the packed array."""
+        return self.ids.buffer_info()[1] * self.ids.itemsize
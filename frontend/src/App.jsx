@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react'
+import { useState, useEffect, useCallback, useRef } from 'react'
 
 const API = '/api'
 
@@ -33,6 +33,15 @@ function SeverityDots({ severity }) {
   )
 }
 
+function Highlighted({ text }) {
+  // Search snippets wrap matches in <mark>…</mark>; render them without innerHTML
+  return text.split(/(<mark>.*?<\/mark>)/g).map((part, i) =>
+    part.startsWith('<mark>')
+      ? <mark key={i} className="bg-yellow-500/30 text-yellow-200 rounded px-0.5">{part.slice(6, -7)}</mark>
+      : part
+  )
+}
+
 function PainPointCard({ item, onClick }) {
   const solutions = Array.isArray(item.potential_solutions) ? item.potential_solutions : []
   const existing = Array.isArray(item.existing_solutions) ? item.existing_solutions : []
@@ -58,8 +67,10 @@ function PainPointCard({ item, onClick }) {
       </div>
 
       <p className="text-sm text-gray-400 line-clamp-2 mb-3">
-        {item.title}
-        {item.body && ` — ${item.body.substring(0, 150)}`}
+        {item.snippet ? <Highlighted text={item.snippet} /> : <>
+          {item.title}
+          {item.body_snippet && ` — ${item.body_snippet.substring(0, 150)}`}
+        </>}
       </p>
 
       {solutions.length > 0 && (
@@ -105,7 +116,8 @@ function DetailModal({ item, onClose }) {
           <h4 className="text-sm font-medium text-gray-400 mb-1">Original Post</h4>
           <div className="bg-gray-950 rounded-lg p-4 text-sm text-gray-300 border border-gray-800">
             <p className="font-medium mb-2">{item.title}</p>
-            <p className="whitespace-pre-wrap">{item.body?.substring(0, 1000)}</p>
+            {/* List items only carry body_snippet until the full detail has loaded */}
+            <p className="whitespace-pre-wrap">{(item.body ?? item.body_snippet)?.substring(0, 1000)}</p>
           </div>
           {item.url && (
             <a href={item.url} target="_blank" rel="noopener noreferrer"
@@ -171,6 +183,7 @@ export default function App() {
   const [selected, setSelected] = useState(null)
   const [loading, setLoading] = useState(true)
   const [scraping, setScraping] = useState(false)
+  const [scrapeProgress, setScrapeProgress] = useState('')
 
   // Filters
   const [subreddit, setSubreddit] = useState('')
@@ -179,6 +192,9 @@ export default function App() {
   const [search, setSearch] = useState('')
   const [searchInput, setSearchInput] = useState('')
   const [page, setPage] = useState(0)
+  const [hasNext, setHasNext] = useState(false)
+  // cursors.current[n] is the cursor that fetches page n (page 0 needs none)
+  const cursors = useRef([null])
   const LIMIT = 20
 
   const fetchData = useCallback(async () => {
@@ -186,10 +202,12 @@ export default function App() {
     try {
       const params = new URLSearchParams({
         limit: LIMIT,
-        offset: page * LIMIT,
         sort_by: sortBy,
         order: 'desc',
+        // Count once per filter change; later pages keep the first page's total
+        include_total: page === 0,
       })
+      if (page > 0) params.set('cursor', cursors.current[page])
       if (subreddit) params.set('subreddit', subreddit)
       if (category) params.set('category', category)
       if (search) params.set('search', search)
@@ -200,7 +218,9 @@ export default function App() {
         fetch(`${API}/trending?limit=5`).then(r => r.json()),
       ])
       setPainPoints(ppRes.items || [])
-      setTotal(ppRes.total || 0)
+      if (page === 0) setTotal(ppRes.total || 0)
+      cursors.current[page + 1] = ppRes.next_cursor
+      setHasNext(Boolean(ppRes.next_cursor))
       setStats(statsRes)
       setTrending(trendRes.items || [])
     } catch (e) {
@@ -211,6 +231,17 @@ export default function App() {
 
   useEffect(() => { fetchData() }, [fetchData])
 
+  // Show the card's data at once, then swap in the full detail view
+  const openDetail = async (item) => {
+    setSelected(item)
+    try {
+      const detail = await fetch(`${API}/pain-points/${item.id}`).then(r => r.json())
+      setSelected(current => (current && current.id === item.id ? detail : current))
+    } catch (e) {
+      console.error('Detail fetch error:', e)
+    }
+  }
+
   const triggerScrape = async () => {
     setScraping(true)
     try {
@@ -218,9 +249,15 @@ export default function App() {
       // Poll status
       const poll = setInterval(async () => {
         const res = await fetch(`${API}/scrape/status`).then(r => r.json())
+        const active = res.jobs.filter(j => j.status === 'running')
+        const scrapeJob = active.find(j => j.kind === 'scrape')
+        const analyzeJob = active.find(j => j.kind === 'analyze')
+        if (scrapeJob) setScrapeProgress(`⏳ Scraping... ${scrapeJob.progress.found || 0} found`)
+        else if (analyzeJob) setScrapeProgress(`⏳ Analyzing... ${analyzeJob.progress.analyzed || 0} done, ${res.backlog} left`)
         if (!res.running) {
           clearInterval(poll)
           setScraping(false)
+          setScrapeProgress('')
           fetchData()
         }
       }, 3000)
@@ -232,11 +269,17 @@ export default function App() {
   const handleSearch = (e) => {
     e.preventDefault()
     setSearch(searchInput)
+    if (!searchInput && sortBy === 'relevance') setSortBy('opportunity_score')
     setPage(0)
   }
 
   const exportData = (format) => {
-    window.open(`${API}/export?format=${format}`, '_blank')
+    // Export everything matching the current filters, not just this page
+    const params = new URLSearchParams({ format, sort_by: sortBy, order: 'desc' })
+    if (subreddit) params.set('subreddit', subreddit)
+    if (category) params.set('category', category)
+    if (search) params.set('search', search)
+    window.open(`${API}/export?${params}`, '_blank')
   }
 
   return (
@@ -267,7 +310,7 @@ export default function App() {
                   : 'bg-blue-600 text-white hover:bg-blue-500'
               }`}
             >
-              {scraping ? '⏳ Scraping...' : '🔄 Run Scraper'}
+              {scraping ? (scrapeProgress || '⏳ Scraping...') : '🔄 Run Scraper'}
             </button>
           </div>
         </div>
@@ -292,7 +335,7 @@ export default function App() {
               {trending.map(item => (
                 <div
                   key={item.id}
-                  onClick={() => setSelected(item)}
+                  onClick={() => openDetail(item)}
                   className="flex-shrink-0 w-72 bg-gray-900 border border-gray-800 rounded-xl p-4 hover:border-blue-500/50 cursor-pointer transition-all"
                 >
                   <div className="flex items-center gap-2 mb-2">
@@ -350,6 +393,7 @@ export default function App() {
             <option value="severity">Severity</option>
             <option value="num_comments">Comments</option>
             <option value="created_utc">Newest</option>
+            {search && <option value="relevance">Relevance</option>}
           </select>
         </div>
 
@@ -369,7 +413,7 @@ export default function App() {
               disabled={scraping}
               className="px-6 py-2 bg-blue-600 text-white rounded-lg hover:bg-blue-500 text-sm"
             >
-              {scraping ? '⏳ Scraping...' : '🔄 Start Scraping'}
+              {scraping ? (scrapeProgress || '⏳ Scraping...') : '🔄 Start Scraping'}
             </button>
           </div>
         ) : (
@@ -377,7 +421,7 @@ export default function App() {
             <p className="text-xs text-gray-500 mb-3">{total} results</p>
             <div className="grid gap-4 md:grid-cols-2">
               {painPoints.map(item => (
-                <PainPointCard key={item.id} item={item} onClick={setSelected} />
+                <PainPointCard key={item.id} item={item} onClick={openDetail} />
               ))}
             </div>
 
@@ -396,7 +440,7 @@ export default function App() {
                 </span>
                 <button
                   onClick={() => setPage(p => p + 1)}
-                  disabled={(page + 1) * LIMIT >= total}
+                  disabled={!hasNext}
                   className="px-4 py-2 bg-gray-800 rounded-lg text-sm disabled:opacity-30"
                 >
                   Next →